@@ -1,32 +1,47 @@
-import textwrap
-try:
-    from ConfigParser import NoSectionError
-except:
-    from configparser import NoSectionError
 from warnings import warn
+from argutils.instrument import timed
 
 META_KEY = "_meta"
 DESC_KEY = "help"
 EXCLUDE_FLAG = "_exclude"
 FILE_W = "File-w"
 FILE_R = "File-r"
+FILE_WB = "File-wb"
+FILE_RB = "File-rb"
+FILE_MMAP = "File-mmap"
+LAZY_FILE_W = "LazyFile-w"
+LAZY_FILE_R = "LazyFile-r"
+LAZY_FILE_WB = "LazyFile-wb"
+LAZY_FILE_RB = "LazyFile-rb"
+INT_ARRAY = "int-array"
+FLOAT_ARRAY = "float-array"
 
-def set_parser_defaults(parser, config):
+@timed('set_parser_defaults')
+def set_parser_defaults(parser, config, section=None):
     """Sets the defaults for an ArgumentParser from a ConfigParser object.
 
     :param parser: the ArgumentParser to set
     :param config: the ConfigParser to read the defaults from. Should have a 
     section matching the ArgumentParser's `prog` field.
+    :param section: (optional) the config section to read, if it differs from
+    the parser's `prog` field (i.e. for subcommand parsers)
     :returns: the updated ArgumentParser
     """
-
-    try:
-        defaults = dict(config.items(parser.prog))
-        parser.set_defaults(**defaults)
-        return parser
-    except NoSectionError:
-        warn("Section [{0}] not found in config file".format(parser.prog))
+    section = section or parser.prog
+    if not config.has_section(section):
+        warn("Section [{0}] not found in config file".format(section))
         return parser
+    defaults = dict(config.items(section))
+    parser.set_defaults(**defaults)
+    return parser
+
+# Wrapped comments, keyed on (text, width, quote). Help strings are often
+# shared between options and commands, so this is cleared rather than grown
+# once it reaches COMMENT_CACHE_SIZE entries.
+COMMENT_CACHE_SIZE = 1024
+_comment_cache = {}
+# Characters that textwrap would replace or expand before wrapping
+_SPECIAL_WHITESPACE = frozenset("\t\n\x0b\x0c\r")
 
 def format_comment(text, width=72, quote="# "):
     """Line-wraps and pads text to write as a comment.
@@ -38,6 +53,25 @@ def format_comment(text, width=72, quote="# "):
 
     if not text: 
         return ""
+    key = (text, width, quote)
+    try:
+        return _comment_cache[key]
+    except KeyError:
+        pass
+    except TypeError:
+        # Unhashable text; format it without caching
+        return _format_comment(text, width, quote)
+    if len(_comment_cache) >= COMMENT_CACHE_SIZE:
+        _comment_cache.clear()
+    comment = _comment_cache[key] = _format_comment(text, width, quote)
+    return comment
+
+def _format_comment(text, width, quote):
+    # Short single-line text doesn't need textwrap at all
+    if len(text) <= width and _SPECIAL_WHITESPACE.isdisjoint(text):
+        line = text.strip()
+        return quote + line + "\n" if line else "\n"
+    import textwrap
     lines = textwrap.wrap(text, width=width)
     lines = [quote + line.strip() for line in lines if line.strip()]
-    return "\n".join(lines) + "\n"
\ No newline at end of file
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,5 @@
+import sys
+
+from argutils.cli import main
+
+sys.exit(main())
@@ -0,0 +1,152 @@
+"""Functions to validate many command lines against a spec at once."""
+import argparse
+import functools
+import threading
+from collections import namedtuple
+from warnings import warn
+
+from argutils import export
+from argutils.snapshot import Snapshot
+
+
+class ParseResult(namedtuple('ParseResult', ['argv', 'namespace', 'error'])):
+    """The outcome of parsing one command line.
+
+    `namespace` holds the parsed arguments if parsing succeeded; otherwise it
+    is None and `error` holds the message argparse would have printed (the
+    help text, for --help).
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class ParseError(Exception):
+    """Raised instead of exiting when a command line can't be parsed."""
+
+
+class _NonExitingParser(argparse.ArgumentParser):
+    """An ArgumentParser that raises ParseError instead of exiting."""
+
+    def __init__(self, *args, **kwargs):
+        super(_NonExitingParser, self).__init__(*args, **kwargs)
+        # The parser is shared between the threads of a thread pool
+        self._printed = threading.local()
+
+    def error(self, message):
+        raise ParseError(message)
+
+    def exit(self, status=0, message=None):
+        # Reached for --help and --version, after the text was "printed"
+        printed = getattr(self._printed, 'message', None)
+        self._printed.message = None
+        raise ParseError(
+            message or printed or "exited with status {0}".format(status))
+
+    def _print_message(self, message, file=None):
+        self._printed.message = message
+
+
+def parse_many(cmd_name, argsdict, argv_list, desc=None, config=None,
+               pool=None, workers=None, restore=False):
+    """Parses many command lines against the same spec without exiting.
+
+    The parser is built once (or once per worker process) and each command
+    line's result is returned in order, whether or not it was valid.
+
+    :param cmd_name: name of the command
+    :param argsdict: a dictionary of arguments, as provided by argutils.read.*
+    :param argv_list: a sequence of argument lists to parse
+    :param desc: (optional) a description of the command, if one is not
+    provided by argsdict.
+    :param config: a ConfigParser object to read defaults from, as with
+    `argutils.set_parser_defaults`
+    :param pool: None to parse in this thread, 'thread' to use a thread pool,
+    or 'process' to use a process pool. Workers in a process pool return a
+    Snapshot of each Namespace in place of the Namespace; call its `restore`
+    to open any files again.
+    :param workers: (optional) the number of threads or processes to use
+    :param restore: if True, the Snapshots from a process pool are restored
+    before they're returned, which opens every file argument again (and
+    appends to files opened for writing)
+    :returns: a list of ParseResults, in the same order as argv_list
+    """
+    defaults = _config_defaults(config, cmd_name)
+    if pool is None:
+        parser = _build_parser(cmd_name, argsdict, desc, defaults)
+        return [_parse(parser, argv) for argv in argv_list]
+    elif pool == 'thread':
+        from multiprocessing.pool import ThreadPool
+        # argparse doesn't modify the parser while parsing, so one parser
+        # can be shared between the threads
+        parser = _build_parser(cmd_name, argsdict, desc, defaults)
+        workers_pool = ThreadPool(workers)
+        func = functools.partial(_parse, parser)
+    elif pool == 'process':
+        from multiprocessing import Pool
+        workers_pool = Pool(
+            workers, initializer=_init_worker,
+            initargs=(cmd_name, argsdict, desc, defaults))
+        func = _parse_in_worker
+    else:
+        raise ValueError("Unknown pool type: {0}".format(pool))
+
+    argv_list = list(argv_list)
+    chunksize = max(1, len(argv_list) // (4 * (workers or 4)))
+    try:
+        results = workers_pool.map(func, argv_list, chunksize)
+    finally:
+        workers_pool.close()
+        workers_pool.join()
+    if pool == 'process' and restore:
+        results = [_restore(result) for result in results]
+    return results
+
+
+def _config_defaults(config, section):
+    """Reads the defaults that `set_parser_defaults` would apply."""
+    if config is None:
+        return None
+    if not config.has_section(section):
+        warn("Section [{0}] not found in config file".format(section))
+        return None
+    return dict(config.items(section))
+
+
+def _build_parser(cmd_name, argsdict, desc, defaults):
+    parser = export.to_argparser(
+        cmd_name, argsdict, desc, parser_class=_NonExitingParser)
+    if defaults:
+        parser.set_defaults(**defaults)
+    return parser
+
+
+def _parse(parser, argv):
+    try:
+        return ParseResult(argv, parser.parse_args(argv), None)
+    except ParseError as err:
+        return ParseResult(argv, None, str(err))
+
+
+# The parser for the current worker process, built once by _init_worker
+_worker_parser = None
+
+
+def _init_worker(cmd_name, argsdict, desc, defaults):
+    global _worker_parser
+    _worker_parser = _build_parser(cmd_name, argsdict, desc, defaults)
+
+
+def _parse_in_worker(argv):
+    result = _parse(_worker_parser, argv)
+    if result.ok:
+        result = result._replace(namespace=Snapshot.take(result.namespace))
+    return result
+
+
+def _restore(result):
+    if result.ok:
+        result = result._replace(namespace=result.namespace.restore())
+    return result
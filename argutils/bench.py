@@ -0,0 +1,270 @@
+"""Benchmarks for reading specs, building parsers and exporting configs.
+
+Run with `python -m argutils.bench`. Results can be saved as JSON with
+`--output` and compared against an earlier run with `--compare`.
+"""
+from __future__ import print_function
+import io
+import json
+import os
+import sys
+import timeit
+from collections import OrderedDict
+
+import argutils
+from argutils import (
+    read, export, META_KEY, DESC_KEY, EXCLUDE_FLAG
+)
+from argutils.spec import CommandSpec
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+
+
+def make_spec(size):
+    """Builds a synthetic argsdict with the given number of arguments.
+
+    The arguments cycle through the same kinds of options used in the test
+    suite: plain options with defaults, typed options, excluded options,
+    flags, and options with choices.
+
+    :param size: the number of arguments
+    """
+    spec = OrderedDict()
+    spec[META_KEY] = OrderedDict([
+        (DESC_KEY, "Synthetic spec of {0} arguments".format(size))])
+    for i in range(size):
+        name = "arg{0}".format(i)
+        kind = i % 5
+        if kind == 0:
+            argvals = [('default', 'value{0}'.format(i)),
+                       (DESC_KEY, 'Help for argument {0}'.format(i))]
+        elif kind == 1:
+            argvals = [('default', i), ('type', 'int'),
+                       (DESC_KEY, 'An integer argument')]
+        elif kind == 2:
+            argvals = [('default', i), (EXCLUDE_FLAG, True), ('type', 'int'),
+                       (DESC_KEY, 'This arg does not appear in the config')]
+        elif kind == 3:
+            argvals = [('argtype', 'flag'), (DESC_KEY, 'This is a flag')]
+        else:
+            argvals = [('default', 1), ('choices', "1, 2, 3"),
+                       ('type', 'int')]
+        spec[name] = OrderedDict(argvals)
+    return spec
+
+
+def to_json(spec):
+    """Serializes a spec to a JSON string."""
+    return json.dumps(spec, indent=2)
+
+
+def to_yaml(spec):
+    """Serializes a spec to a block-style YAML string, preserving order."""
+    lines = []
+    for argname, argvals in spec.items():
+        lines.append("{0}:".format(argname))
+        for key, value in argvals.items():
+            # JSON scalars are also valid YAML scalars
+            lines.append("  {0}: {1}".format(key, json.dumps(value)))
+    return "\n".join(lines) + "\n"
+
+
+def _measure(func, repeat):
+    """Times `func` and measures its memory use.
+
+    :returns: the best time in seconds, the peak memory allocated during the
+    call, and the memory still held by its result (or None for both if
+    tracemalloc isn't available)
+    """
+    times = timeit.repeat(func, number=1, repeat=repeat)
+    peak = retained = None
+    try:
+        import tracemalloc
+    except ImportError:
+        pass
+    else:
+        tracemalloc.start()
+        try:
+            result = func()
+            retained, peak = tracemalloc.get_traced_memory()
+            del result
+        finally:
+            tracemalloc.stop()
+    return min(times), peak, retained
+
+
+def run(sizes=DEFAULT_SIZES, repeat=5):
+    """Runs every benchmark on specs of each size.
+
+    :param sizes: the numbers of arguments to generate specs with
+    :param repeat: how many times to time each benchmark (the best is kept)
+    :returns: a list of result dictionaries
+    """
+    try:
+        from ConfigParser import SafeConfigParser as ConfigParser
+    except ImportError:
+        from configparser import ConfigParser
+
+    results = []
+    for size in sizes:
+        spec = make_spec(size)
+        json_str = to_json(spec)
+        yaml_str = to_yaml(spec)
+        parser = export.to_argparser('bench', spec)
+        command_spec = CommandSpec.from_dict(spec)
+        config = ConfigParser()
+        cfg_file = io.StringIO(u"".join(export.iter_config('bench', spec)))
+        getattr(config, 'read_file', getattr(config, 'readfp', None))(cfg_file)
+        argv = ['--arg0', 'x', '--arg1', '5']
+
+        funcs = OrderedDict([
+            ('read.from_json', lambda: read.from_json(json_str)),
+            ('read.from_yaml', lambda: read.from_yaml(yaml_str)),
+            ('CommandSpec.from_json',
+             lambda: CommandSpec.from_dict(read.from_json(json_str))),
+            ('export.to_argparser',
+             lambda: export.to_argparser('bench', spec)),
+            ('to_argparser(spec)',
+             lambda: export.to_argparser('bench', command_spec)),
+            ('export.to_config', lambda: export.to_config('bench', spec)),
+            ('set_parser_defaults',
+             lambda: argutils.set_parser_defaults(parser, config)),
+            ('parse_args', lambda: parser.parse_args(argv)),
+        ])
+        for name, func in funcs.items():
+            seconds, peak, retained = _measure(func, repeat)
+            results.append(OrderedDict([
+                ('benchmark', name), ('size', size), ('seconds', seconds),
+                ('peak_bytes', peak), ('retained_bytes', retained)]))
+    return results
+
+
+def run_file(filename, cmd_name=None, repeat=5):
+    """Times the startup steps of a program using a given spec file.
+
+    :param filename: path to a JSON or YAML spec file
+    :param cmd_name: (optional) the program name (default: the file name)
+    :param repeat: how many times to time each benchmark (the best is kept)
+    :returns: a list of result dictionaries, as from `run`
+    """
+    import shutil
+    import tempfile
+    cmd_name = cmd_name or os.path.basename(filename).split('.')[0]
+    # Parsers are built from the spec with any shared files included
+    spec = read.composed(filename)
+    command_spec = CommandSpec.from_dict(spec)
+    size = len(command_spec.args)
+    cache_dir = tempfile.mkdtemp()
+    try:
+        read.from_path(filename, use_cache=True, cache_dir=cache_dir)
+        funcs = OrderedDict([
+            ('read.from_path', lambda: read.from_path(filename)),
+            ('read.from_path(cached)', lambda: read.from_path(
+                filename, use_cache=True, cache_dir=cache_dir)),
+            ('CommandSpec.from_dict', lambda: CommandSpec.from_dict(spec)),
+            ('export.to_argparser',
+             lambda: export.to_argparser(cmd_name, spec)),
+            ('export.to_fastparser',
+             lambda: export.to_fastparser(cmd_name, spec)),
+            ('export.to_config', lambda: export.to_config(cmd_name, spec)),
+        ])
+        results = []
+        for name, func in funcs.items():
+            seconds, peak, retained = _measure(func, repeat)
+            results.append(OrderedDict([
+                ('benchmark', name), ('size', size), ('seconds', seconds),
+                ('peak_bytes', peak), ('retained_bytes', retained)]))
+        return results
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def save(results, filename):
+    """Writes benchmark results to a JSON file.
+
+    :param results: results, as returned by `run`
+    :param filename: where to write the results
+    """
+    with open(filename, 'w') as out:
+        json.dump({
+            'python': sys.version.split()[0],
+            'results': results
+        }, out, indent=2)
+
+
+def load(filename):
+    """Reads benchmark results written by `save`."""
+    with open(filename) as infile:
+        return json.load(infile)['results']
+
+
+def compare(old, new):
+    """Lines up two sets of results.
+
+    :param old: the baseline results, as returned by `run` or `load`
+    :param new: the results to compare against the baseline
+    :returns: a list of (benchmark, size, old seconds, new seconds, ratio)
+    """
+    baseline = dict(((r['benchmark'], r['size']), r['seconds']) for r in old)
+    rows = []
+    for result in new:
+        key = (result['benchmark'], result['size'])
+        if key not in baseline:
+            continue
+        old_seconds = baseline[key]
+        ratio = result['seconds'] / old_seconds if old_seconds else None
+        rows.append(key + (old_seconds, result['seconds'], ratio))
+    return rows
+
+
+def format_results(results):
+    """Formats results from `run` as a text table."""
+    lines = ["{0:<22} {1:>6} {2:>12} {3:>12} {4:>12}".format(
+        "benchmark", "size", "ms", "peak KiB", "held KiB")]
+    for r in results:
+        peak, retained = [
+            "-" if value is None else "{0:.1f}".format(value / 1024.0)
+            for value in (r['peak_bytes'], r.get('retained_bytes'))]
+        lines.append("{0:<22} {1:>6} {2:>12.3f} {3:>12} {4:>12}".format(
+            r['benchmark'], r['size'], r['seconds'] * 1000, peak, retained))
+    return "\n".join(lines)
+
+
+def format_comparison(rows):
+    """Formats rows from `compare` as a text table."""
+    lines = ["{0:<22} {1:>6} {2:>10} {3:>10} {4:>7}".format(
+        "benchmark", "size", "old ms", "new ms", "ratio")]
+    for benchmark, size, old, new, ratio in rows:
+        ratio = "-" if ratio is None else "{0:.2f}".format(ratio)
+        lines.append("{0:<22} {1:>6} {2:>10.3f} {3:>10.3f} {4:>7}".format(
+            benchmark, size, old * 1000, new * 1000, ratio))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='python -m argutils.bench', description=__doc__.split("\n")[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+        help='numbers of arguments in the generated specs')
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='times to run each benchmark (the best time is kept)')
+    parser.add_argument(
+        '-o', '--output', help='write results to this JSON file')
+    parser.add_argument(
+        '--compare', metavar='JSON', help='compare against earlier results')
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat)
+    print(format_results(results))
+    if args.output:
+        save(results, args.output)
+    if args.compare:
+        print()
+        print(format_comparison(compare(load(args.compare), results)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""Caches for parsed specs (on disk) and built parsers (in memory)."""
+import os
+from collections import OrderedDict
+
+CACHE_DIR_ENV = "ARGUTILS_CACHE_DIR"
+# Bump this whenever the layout of a cache entry changes
+CACHE_VERSION = 1
+
+
+def default_cache_dir():
+    """Returns the directory used to store cache entries.
+
+    The location can be overridden with the ARGUTILS_CACHE_DIR environment
+    variable; otherwise it is `~/.cache/argutils`.
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if not cache_dir:
+        cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "argutils")
+    return cache_dir
+
+
+def content_digest(data):
+    """Returns a hex digest identifying the given bytes."""
+    import hashlib
+    return hashlib.sha1(data).hexdigest()
+
+
+def file_signature(filename):
+    """Returns a cheap signature (mtime, size) of a file from a single stat.
+
+    :param filename: path to the file
+    """
+    st = os.stat(filename)
+    mtime = getattr(st, 'st_mtime_ns', None) or st.st_mtime
+    return (mtime, st.st_size)
+
+
+def entry_path(cache_dir, namespace, key):
+    """Returns the path of the cache entry for a given key.
+
+    :param cache_dir: the cache directory
+    :param namespace: a label separating different kinds of entries (for
+    instance, the loader used to parse a spec)
+    :param key: a string identifying the entry within the namespace
+    """
+    name = content_digest(
+        "{0}:{1}:{2}".format(CACHE_VERSION, namespace, key).encode('utf-8')
+    )
+    return os.path.join(cache_dir, name + ".pickle")
+
+
+def read_entry(path):
+    """Reads a cache entry, returning None if it is missing or unreadable.
+
+    Corrupt or truncated entries are treated as misses; they will be replaced
+    the next time the entry is written.
+
+    :param path: the cache entry path, as returned by `entry_path`
+    """
+    import pickle
+    try:
+        with open(path, 'rb') as entry_file:
+            entry = pickle.load(entry_file)
+    except Exception:
+        return None
+    if not isinstance(entry, dict) or entry.get('version') != CACHE_VERSION:
+        return None
+    return entry
+
+
+def write_entry(path, entry):
+    """Atomically writes a cache entry.
+
+    The entry is written to a temporary file in the cache directory and then
+    renamed over the destination, so concurrent readers only ever see a
+    complete entry. Failures to write (read-only filesystems, races on
+    creating the directory, etc.) are ignored, since the cache is only an
+    optimization.
+
+    :param path: the cache entry path, as returned by `entry_path`
+    :param entry: a picklable dictionary
+    """
+    import pickle
+    import tempfile
+    entry = dict(entry, version=CACHE_VERSION)
+    cache_dir = os.path.dirname(path)
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+    except OSError:
+        if not os.path.isdir(cache_dir):
+            return False
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    except OSError:
+        return False
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            pickle.dump(entry, tmp_file, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, path)
+        return True
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
+
+
+def spec_digest(*parts):
+    """Returns a stable hex digest of JSON-like values (i.e. argsdicts).
+
+    Dictionary order is significant, since it determines argument order.
+
+    :param parts: the values to hash
+    """
+    import json
+    data = json.dumps(parts, default=_json_default, separators=(',', ':'))
+    return content_digest(data.encode('utf-8'))
+
+
+def _json_default(value):
+    # CommandSpecs and ArgSpecs hash the same as the argsdict they came from
+    to_dict = getattr(value, 'to_dict', None)
+    return to_dict() if to_dict is not None else repr(value)
+
+
+def _config_items(config, section):
+    """Returns the items of a config section, or None if there aren't any."""
+    if config is None or not config.has_section(section):
+        return None
+    return config.items(section)
+
+
+class ParserCache(object):
+    """A thread-safe, size-limited cache of ArgumentParsers.
+
+    Parsers are keyed on a digest of the command name, argsdict, description
+    and the contents of the command's config section, and the least recently
+    used parser is evicted once `maxsize` parsers are cached. Config defaults
+    are applied when a parser is built, so parsers are never modified after
+    they're cached and can be shared between threads and requests. Don't call
+    `set_parser_defaults` (or anything else that modifies the parser) on a
+    parser returned by `get`; use a different config instead.
+
+    :param maxsize: the maximum number of parsers to keep
+    """
+
+    def __init__(self, maxsize=128):
+        import threading
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._parsers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cmd_name, argsdict, desc=None, config=None):
+        """Returns a parser for the spec, building it if it isn't cached.
+
+        Takes the same arguments as `argutils.export.to_argparser`; if
+        `config` is given, its defaults are applied as by
+        `argutils.set_parser_defaults`.
+        """
+        key = spec_digest(
+            cmd_name, argsdict, desc, _config_items(config, cmd_name))
+        with self._lock:
+            parser = self._parsers.pop(key, None)
+            if parser is not None:
+                self._parsers[key] = parser
+                self.hits += 1
+                return parser
+            self.misses += 1
+
+        # Built outside the lock so slow builds don't block other lookups
+        parser = self._build(cmd_name, argsdict, desc, config)
+        with self._lock:
+            self._parsers[key] = parser
+            while len(self._parsers) > self.maxsize:
+                self._parsers.popitem(last=False)
+                self.evictions += 1
+        return parser
+
+    def parse_args(self, cmd_name, argsdict, args, desc=None, config=None):
+        """Parses arguments with the cached parser for a spec.
+
+        :param args: the arguments to parse
+        :returns: a Namespace of the parsed arguments
+        """
+        return self.get(cmd_name, argsdict, desc, config).parse_args(args)
+
+    def stats(self):
+        """Returns the cache's hit, miss and eviction counts and size."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'size': len(self._parsers),
+                    'maxsize': self.maxsize}
+
+    def clear(self):
+        """Removes every cached parser (the counts are kept)."""
+        with self._lock:
+            self._parsers.clear()
+
+    def __len__(self):
+        return len(self._parsers)
+
+    @staticmethod
+    def _build(cmd_name, argsdict, desc, config):
+        from argutils import export, set_parser_defaults
+        parser = export.to_argparser(cmd_name, argsdict, desc)
+        if config is not None:
+            parser = set_parser_defaults(parser, config)
+        return parser
@@ -0,0 +1,150 @@
+"""The `argutils` command, for building artifacts from spec files.
+
+    argutils compile spec.yaml -o spec_args.py   # generated parser module
+    argutils compile spec.yaml --format cache    # warm the parsed-spec cache
+    argutils config spec.yaml -o spec.cfg
+    argutils completion spec.yaml --shell bash -o spec.bash
+    argutils bench spec.yaml
+"""
+from __future__ import print_function
+import argparse
+import contextlib
+import os
+import sys
+
+from argutils import read, export
+
+
+def main(argv=None):
+    """Runs the `argutils` command.
+
+    :param argv: the arguments (default: sys.argv[1:])
+    :returns: the exit status
+    """
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args) or 0
+    except (IOError, OSError, ValueError) as err:
+        parser.exit(1, "argutils: error: {0}\n".format(err))
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(
+        prog='argutils',
+        description="Build parsers, config files and completions from "
+                    "argutils spec files.")
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subparsers.required = True
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('spec', help='a JSON or YAML spec file')
+    common.add_argument(
+        '--name', help="the program's name (default: the spec's file name)")
+
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument(
+        '-o', '--output', help='where to write the output (default: stdout)')
+
+    compile_parser = subparsers.add_parser(
+        'compile', parents=[common, output],
+        help='validate a spec and write a fast-loading artifact')
+    compile_parser.add_argument(
+        '--format', choices=['module', 'cache', 'index'], default='module',
+        help="'module' writes a Python module defining build_parser(); "
+             "'cache' stores the parsed spec in the cache used by "
+             "read.from_path(use_cache=True); 'index' writes the index of "
+             "a multi-command spec (default: %(default)s)")
+    compile_parser.add_argument(
+        '--cache-dir', help='the cache directory, for --format cache')
+    compile_parser.set_defaults(func=_compile)
+
+    config_parser = subparsers.add_parser(
+        'config', parents=[common, output], help='write a config file')
+    config_parser.set_defaults(func=_config)
+
+    completion_parser = subparsers.add_parser(
+        'completion', parents=[common, output],
+        help='write a shell completion script')
+    completion_parser.add_argument(
+        '--shell', choices=sorted(export._COMPLETION_FUNCS), default='bash',
+        help='the shell to complete in (default: %(default)s)')
+    completion_parser.set_defaults(func=_completion)
+
+    bench_parser = subparsers.add_parser(
+        'bench', parents=[common, output],
+        help="time the startup steps for a spec (-o saves the results as "
+             "JSON)")
+    bench_parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='times to run each step (the best time is kept)')
+    bench_parser.add_argument(
+        '--compare', metavar='JSON', help='compare against earlier results')
+    bench_parser.set_defaults(func=_bench)
+    return parser
+
+
+def _load(args):
+    """Reads and validates the spec, returning the program name and spec."""
+    from argutils.spec import CommandSpec
+    name = args.name or os.path.basename(args.spec).split('.')[0]
+    argsdict = read.composed(args.spec)
+    # Resolving every argument's options catches invalid types and choices
+    CommandSpec.from_dict(argsdict)
+    return name, argsdict
+
+
+@contextlib.contextmanager
+def _output(filename):
+    if filename is None or filename == '-':
+        yield sys.stdout
+    else:
+        with open(filename, 'w') as out:
+            yield out
+
+
+def _compile(args):
+    if args.format == 'index':
+        from argutils import index
+        idx = index.load_index(os.path.abspath(args.spec))
+        if idx['commands'] is None:
+            print("argutils: {0} can't be indexed; it will be read in full"
+                  .format(args.spec), file=sys.stderr)
+        return
+    name, argsdict = _load(args)
+    if args.format == 'cache':
+        read.from_path(args.spec, use_cache=True, cache_dir=args.cache_dir)
+        return
+    source = export.to_python_module(name, argsdict)
+    with _output(args.output) as out:
+        out.write(source)
+
+
+def _config(args):
+    name, argsdict = _load(args)
+    with _output(args.output) as out:
+        export.write_config(name, argsdict, out)
+
+
+def _completion(args):
+    name, argsdict = _load(args)
+    script = export.to_completion(name, argsdict, args.shell)
+    with _output(args.output) as out:
+        out.write(script)
+
+
+def _bench(args):
+    from argutils import bench
+    _load(args)
+    results = bench.run_file(args.spec, args.name, args.repeat)
+    print(bench.format_results(results))
+    if args.output:
+        bench.save(results, args.output)
+    if args.compare:
+        print()
+        print(bench.format_comparison(
+            bench.compare(bench.load(args.compare), results)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""Specs composed from shared files with `$ref` and `$include`.
+
+Options repeated across many specs (threads, input, output, logging...) can
+be kept in shared files and referred to from each spec:
+
+    threads:
+      $ref: common.yaml#threads
+      default: 4
+    $include:
+      - common.yaml#logging
+      - io.yaml
+
+`$ref` replaces a mapping with the one it refers to; any other keys beside
+it are applied on top. `$include` inserts every entry of the mappings it
+refers to at its own position. References are `path#key/key` (the path is
+relative to the referring file, and can be left out to refer within the same
+file); without a `#` they refer to a whole file.
+
+Each shared file is read once per process, and each part of it that's
+referred to is resolved once (it's read again if the file changes); every
+spec using it holds the same objects rather than copies, so composed specs
+should be treated as read-only.
+"""
+import os
+from collections import OrderedDict
+
+from argutils import cache, read
+
+REF_KEY = "$ref"
+INCLUDE_KEY = "$include"
+
+# Resolved references to shared files, as {(path, keys): (dependencies,
+# value)}, where the dependencies are the (path, signature) of every file the
+# value was read from
+_resolved = {}
+
+
+def load(filename, fmt=None, use_cache=False, cache_dir=None):
+    """Reads a spec file, resolving its references.
+
+    :param filename: path to a JSON or YAML spec file
+    :param fmt: (optional) 'json' or 'yaml' (see `read.from_path`)
+    :param use_cache: if True, files are parsed through the on-disk cache
+    used by `read.cached`, so they're only parsed once per cache lifetime
+    :param cache_dir: where to store cache entries
+    :returns: an OrderedDict of the spec
+    """
+    resolver = _Resolver(fmt, use_cache, cache_dir)
+    path = os.path.abspath(filename)
+    return resolver.resolve(resolver.parse(path), path, [(path, '')])
+
+
+def clear():
+    """Forgets the shared files resolved so far in this process."""
+    _resolved.clear()
+
+
+class _Resolver(object):
+
+    def __init__(self, fmt, use_cache, cache_dir):
+        self.fmt = fmt
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir
+        self._parsed = {}
+        # The dependencies of each shared file being resolved
+        self._deps = []
+
+    def parse(self, path):
+        """Reads a file (once per resolver), without resolving it."""
+        if path not in self._parsed:
+            self._parsed[path] = read.from_path(
+                path, self.fmt, self.use_cache, self.cache_dir)
+        return self._parsed[path]
+
+    def shared_node(self, path, keys, ref, stack):
+        """Returns the node at `keys` in a shared file, resolved, from this
+        process's cache if neither the file nor any file it refers to has
+        changed since."""
+        cached = _resolved.get((path, keys))
+        if cached is not None and all(
+                cache.file_signature(dep) == signature
+                for dep, signature in cached[0]):
+            self._add_deps(cached[0])
+            return cached[1]
+        self._deps.append([(path, cache.file_signature(path))])
+        try:
+            value = self.resolve(_walk(self.parse(path), keys, ref), path,
+                                 stack + [(path, keys)])
+        finally:
+            deps = self._deps.pop()
+        _resolved[(path, keys)] = (deps, value)
+        self._add_deps(deps)
+        return value
+
+    def _add_deps(self, deps):
+        for pending in self._deps:
+            pending.extend(deps)
+
+    def resolve(self, node, path, stack):
+        """Resolves the references in a node read from `path`.
+
+        :param stack: the references being resolved, as (path, key) pairs
+        (used to detect cycles)
+        """
+        if isinstance(node, list):
+            return [self.resolve(item, path, stack) for item in node]
+        elif not isinstance(node, dict):
+            return node
+        if REF_KEY in node:
+            target = self.deref(node[REF_KEY], path, stack)
+            if len(node) == 1:
+                # The shared object itself
+                return target
+            if not isinstance(target, dict):
+                raise ValueError(
+                    "Reference {0} in {1} can't be combined with other keys"
+                    .format(node[REF_KEY], path))
+            merged = OrderedDict(target)
+            for key, value in node.items():
+                if key != REF_KEY:
+                    merged[key] = self.resolve(value, path, stack)
+            return merged
+        resolved = OrderedDict()
+        for key, value in node.items():
+            if key != INCLUDE_KEY:
+                resolved[key] = self.resolve(value, path, stack)
+                continue
+            refs = value if isinstance(value, list) else [value]
+            for ref in refs:
+                target = self.deref(ref, path, stack)
+                if not isinstance(target, dict):
+                    raise ValueError(
+                        "Included {0} in {1} is not a mapping"
+                        .format(ref, path))
+                resolved.update(target)
+        return resolved
+
+    def deref(self, ref, path, stack):
+        """Returns the resolved node a reference refers to."""
+        ref_file, _, keys = ref.partition('#')
+        keys = '/'.join(filter(None, keys.split('/')))
+        if ref_file:
+            ref_path = os.path.abspath(
+                os.path.join(os.path.dirname(path), ref_file))
+        else:
+            ref_path = path
+        # References are tracked by file and key, so that files can refer to
+        # different parts of each other
+        key = (ref_path, keys)
+        if key in stack:
+            chain = stack[stack.index(key):] + [key]
+            raise ValueError("Circular reference: {0}".format(" -> ".join(
+                "{0}#{1}".format(p, k) if k else p for p, k in chain)))
+        if ref_file:
+            return self.shared_node(ref_path, keys, ref, stack)
+        # Within the same file: resolve the referred node from the file as
+        # it was read
+        node = _walk(self.parse(path), keys, ref)
+        return self.resolve(node, path, stack + [key])
+
+
+def _walk(node, keys, ref):
+    for key in filter(None, keys.split('/')):
+        try:
+            node = node[key]
+        except (KeyError, TypeError):
+            raise ValueError("Reference {0} not found".format(ref))
+    return node
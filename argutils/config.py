@@ -0,0 +1,175 @@
+"""Defaults merged from a stack of config files.
+
+Programs often read defaults from several config files (i.e. system, site,
+user and project files), where later files override earlier ones.
+`set_layered_defaults` merges a section across the files, converts each
+value to its argument's type, and caches the result on disk. The cache is
+keyed on the files' paths and checked against their modification times and
+sizes, so an unchanged stack costs a stat call per file. (The spec is hashed
+too, but only once per spec object.)
+"""
+import argparse
+import os
+import sys
+from warnings import warn
+
+from argutils import cache
+from argutils.instrument import timed
+from argutils.spec import ArgSpec, CommandSpec, _is_binary
+from argutils.types import ArrayType, LazyFileType, MmapType
+
+# The values ConfigParser.getboolean accepts, used for flags and bools
+_BOOLEAN_STATES = {
+    '1': True, 'yes': True, 'true': True, 'on': True,
+    '0': False, 'no': False, 'false': False, 'off': False,
+}
+_FILE_TYPES = (argparse.FileType, LazyFileType, MmapType)
+_MULTI_NARGS = ('+', '*')
+# The last spec used with each cache entry and its digest, as
+# {entry path: (argsdict, digest)}
+_spec_digests = {}
+
+
+def set_layered_defaults(parser, argsdict, filenames, section=None,
+                         cache_dir=None, use_cache=True):
+    """Sets the defaults for an ArgumentParser from a stack of config files.
+
+    :param parser: the ArgumentParser to set
+    :param argsdict: a dictionary of arguments, as provided by argutils.read.*,
+    used to convert the values to the arguments' types
+    :param filenames: the config files, in increasing order of precedence.
+    Files that don't exist are skipped.
+    :param section: (optional) the config section to read, if it differs from
+    the parser's `prog` field (i.e. for subcommand parsers)
+    :param cache_dir: where to cache the merged defaults (default: see
+    `argutils.cache.default_cache_dir`)
+    :param use_cache: if False, the files are always read
+    :returns: the updated ArgumentParser
+    """
+    section = section or parser.prog
+    defaults = merged_defaults(
+        filenames, argsdict, section, cache_dir, use_cache)
+    if defaults is None:
+        warn("Section [{0}] not found in config files".format(section))
+        return parser
+    parser.set_defaults(**defaults)
+    return parser
+
+
+@timed('config.merged_defaults')
+def merged_defaults(filenames, argsdict, section, cache_dir=None,
+                    use_cache=True):
+    """Merges a section across a stack of config files.
+
+    Values for flags (and `bool` arguments) are read as booleans, as with
+    `ConfigParser.getboolean`, with empty values treated as False. Other
+    values are converted to the argument's type, with empty values treated
+    as unset (None). File arguments are left as paths for argparse to open,
+    except for 'stdin' and 'stdout'.
+
+    :param filenames: the config files, in increasing order of precedence
+    :param argsdict: a dictionary of arguments, as provided by argutils.read.*
+    :param section: the config section to read
+    :param cache_dir: where to cache the merged defaults (default: see
+    `argutils.cache.default_cache_dir`)
+    :param use_cache: if False, the files are always read
+    :returns: a dict of defaults, or None if no file has the section
+    """
+    filenames = [os.path.abspath(filename) for filename in filenames]
+    signatures = [_signature(filename) for filename in filenames]
+    if not use_cache:
+        entry = _merge(filenames, signatures, argsdict, section)
+        return _resolve_streams(entry)
+
+    entry_fp = cache.entry_path(
+        cache_dir or cache.default_cache_dir(), 'config',
+        "{0}:{1}".format(section, os.pathsep.join(filenames)))
+    spec = _spec_digest(entry_fp, argsdict)
+    entry = cache.read_entry(entry_fp)
+    if not (entry and entry.get('signatures') == signatures and
+            entry.get('spec') == spec):
+        entry = _merge(filenames, signatures, argsdict, section)
+        cache.write_entry(entry_fp, dict(entry, signatures=signatures,
+                                         spec=spec))
+    return _resolve_streams(entry)
+
+
+def _spec_digest(entry_fp, argsdict):
+    """Returns the digest of a spec, hashing it only the first time the
+    spec object is used with a cache entry (specs are treated as
+    read-only)."""
+    memo = _spec_digests.get(entry_fp)
+    if memo is not None and memo[0] is argsdict:
+        return memo[1]
+    digest = cache.spec_digest(argsdict)
+    _spec_digests[entry_fp] = (argsdict, digest)
+    return digest
+
+
+def _signature(filename):
+    try:
+        return cache.file_signature(filename)
+    except OSError:
+        return None
+
+
+def _merge(filenames, signatures, argsdict, section):
+    """Reads and converts the section; returns a picklable cache entry."""
+    try:
+        from ConfigParser import SafeConfigParser as ConfigParser
+    except ImportError:
+        from configparser import ConfigParser
+
+    config = ConfigParser()
+    config.read([filename for filename, signature
+                 in zip(filenames, signatures) if signature is not None])
+    if not config.has_section(section):
+        return {'value': None, 'streams': {}}
+
+    spec = CommandSpec.from_dict(argsdict)
+    value = {}
+    # Stream defaults can't be cached, so they're resolved after loading
+    streams = {}
+    for key, raw in config.items(section):
+        arg = spec.get(key)
+        if not isinstance(arg, ArgSpec):
+            value[key] = raw
+        elif isinstance(arg.type, _FILE_TYPES) and raw in ('stdin', 'stdout'):
+            streams[key] = (raw, _is_binary(arg.type))
+        else:
+            try:
+                value[key] = _coerce(arg, raw)
+            except (KeyError, TypeError, ValueError,
+                    argparse.ArgumentTypeError):
+                raise ValueError(
+                    "Invalid value for `{0}` in section [{1}]: {2!r}"
+                    .format(key, section, raw))
+    return {'value': value, 'streams': streams}
+
+
+def _coerce(arg, raw):
+    """Converts a config value to the type of an ArgSpec."""
+    raw = raw.strip()
+    if arg.argtype == 'flag' or arg.type is bool:
+        return _BOOLEAN_STATES[raw.lower()] if raw else False
+    elif arg.type is str or isinstance(arg.type, _FILE_TYPES):
+        return raw
+    elif not raw:
+        return None
+    elif isinstance(arg.type, ArrayType):
+        return arg.type(raw)
+    elif arg.nargs in _MULTI_NARGS or (
+            isinstance(arg.nargs, int) and arg.nargs > 1):
+        return [arg.type(item) for item in raw.split()]
+    return arg.type(raw)
+
+
+def _resolve_streams(entry):
+    value = entry['value']
+    if value is None:
+        return None
+    value = dict(value)
+    for key, (name, binary) in entry['streams'].items():
+        stream = sys.stdin if name == 'stdin' else sys.stdout
+        value[key] = getattr(stream, 'buffer', stream) if binary else stream
+    return value
@@ -2,20 +2,31 @@
 from __future__ import print_function
 from collections import OrderedDict
 import argparse
+import functools
+import re
 import sys
 try:
     import __builtin__ as builtins
 except ImportError:
     import builtins
-import six
-import warnings
-
-
 
 from argutils import (
-    format_comment, META_KEY, DESC_KEY, EXCLUDE_FLAG, FILE_W, FILE_R
+    format_comment, set_parser_defaults, META_KEY, DESC_KEY, EXCLUDE_FLAG,
+    FILE_W, FILE_R
+)
+from argutils.instrument import timed
+from argutils.spec import (
+    ArgSpec, Choices, ChoicesAction, CommandSpec, _parse_type, _parse_choices,
+    _resolve_default
+)
+from argutils.types import (
+    ArgfileAction, ArrayAction, ArrayType, LazyFileType, MmapType
 )
 
+CFG_LINE_STR = "{key} = {value}\n"
+CFG_SECTION_STR = "[{header}]\n"
+
+@timed('export.to_config')
 def to_config(cmd_name, argsdict, desc=None):
     """Create an INI-style config file from a given dictionary of arguments.
 
@@ -26,28 +37,39 @@ def to_config(cmd_name, argsdict, desc=None):
     :returns: a string representation of the config file, which can be written 
     to a file
     """ 
+    return "".join(iter_config(cmd_name, argsdict, desc))
+
+def iter_config(cmd_name, argsdict, desc=None):
+    """Yield the INI-style config file for an argsdict in chunks.
+
+    This produces the same output as `to_config` without building the whole
+    file as a single string, which helps with very large specs.
 
-    if not isinstance(argsdict, OrderedDict):
+    :param cmd_name: name of the command (used in the config section header)
+    :param argsdict: a dictionary of arguments, as provided by argutils.read.*
+    :param desc: (optional) a description of the command, if one is not provided
+    by the argsdict
+    :returns: an iterator over strings making up the config file
+    """
+    # Checked here rather than in the generator so the error is raised
+    # immediately, before anything has been written
+    if not isinstance(argsdict, (OrderedDict, CommandSpec)):
         raise ValueError(
             "Arguments dictionary is unordered: output order will be random."
         )
+    return _iter_config(cmd_name, argsdict, desc)
 
-    CFG_LINE_STR = "{key} = {value}\n"
-    CFG_SECTION_STR = "[{header}]\n"
-
-    # The string that will hold the final config file contents
-    out = ""
-
+def _iter_config(cmd_name, argsdict, desc):
     # Use the description provided if it's missing from the argsdict
     if META_KEY in argsdict:
         section_desc = argsdict[META_KEY].get(DESC_KEY, desc)
     else:
         section_desc = desc
 
-    out += format_comment(section_desc, quote="## ")
-    out += CFG_SECTION_STR.format(header=cmd_name)
+    yield format_comment(section_desc, quote="## ")
+    yield CFG_SECTION_STR.format(header=cmd_name)
 
-    for argname, argvals in six.iteritems(argsdict):
+    for argname, argvals in argsdict.items():
         # Skip the metadata section (since we handled already)
         if argname == META_KEY:
             continue
@@ -55,12 +77,21 @@ def to_config(cmd_name, argsdict, desc=None):
         if EXCLUDE_FLAG in argvals:
             continue
 
-        description = format_comment(argvals.get(DESC_KEY, ""))
+        yield format_comment(argvals.get(DESC_KEY, ""))
         default = argvals.get("default", "")
-        line = CFG_LINE_STR.format(key=argname, value=default)
-        out += description + line
+        yield CFG_LINE_STR.format(key=argname, value=default)
 
-    return out
+@timed('export.write_config')
+def write_config(cmd_name, argsdict, outfile, desc=None):
+    """Write the INI-style config file for an argsdict to a file object.
+
+    :param cmd_name: name of the command (used in the config section header)
+    :param argsdict: a dictionary of arguments, as provided by argutils.read.*
+    :param outfile: a writeable file-like object
+    :param desc: (optional) a description of the command, if one is not provided
+    by the argsdict
+    """
+    outfile.writelines(iter_config(cmd_name, argsdict, desc))
 
 def to_config_file(cmd_name, argsdict, filename, desc=None):
     """Writes the config file to the specified location and exits.
@@ -76,13 +107,291 @@ def to_config_file(cmd_name, argsdict, filename, desc=None):
         given)
     """
     print("Writing default config file to {0}".format(filename))
-    default_config = to_config(cmd_name, argsdict, desc)
+    chunks = iter_config(cmd_name, argsdict, desc)
     with open(filename, 'w') as conf_out:
-        conf_out.write(default_config)
+        conf_out.writelines(chunks)
     raise SystemExit()
 
 
-def to_argparser(cmd_name, argsdict, desc=None, config=None):
+def to_python_module(cmd_name, argsdict, desc=None):
+    """Generate the source of a module that builds the ArgumentParser directly.
+
+    The generated module defines `build_parser()`, which returns the same
+    parser as `to_argparser` using plain `add_argument` calls, so programs
+    using it do not need to read the spec or import yaml at startup.
+
+    :param cmd_name: name of the command
+    :param argsdict: a dictionary of arguments, as provided by argutils.read.*
+    :param desc: (optional) a description of the command, if one is not provided
+    by argsdict.
+    :returns: the module source as a string
+    """
+    if META_KEY in argsdict:
+        cmd_desc = argsdict[META_KEY].get(DESC_KEY, desc)
+    else:
+        cmd_desc = desc
+
+    imports = set(['import argparse', 'import sys'])
+    body = [
+        'def build_parser():\n',
+        '    parser = argparse.ArgumentParser(\n',
+        '        prog={0!r}, description={1!r})\n'.format(cmd_name, cmd_desc),
+    ]
+    for argname, argvals in argsdict.items():
+        if argname == META_KEY:
+            continue
+        flag, kwargs = _argument_spec(argname, argvals)
+        body.append('    parser.add_argument(\n        {0!r}'.format(flag))
+        for key, value in kwargs.items():
+            body.append(',\n        {0}={1}'.format(
+                key, _source_repr(value, argname, imports)))
+        body.append(')\n')
+    body.append('    return parser\n')
+
+    out = [
+        '"""Argument parser for {0}.\n\n'.format(cmd_name),
+        'Generated by argutils.export.to_python_module; do not edit.\n"""\n',
+    ]
+    # Plain imports first, then from-imports, as the rest of the code does
+    out.extend(line + '\n' for line in sorted(
+        imports, key=lambda line: (line.startswith('from'), line)))
+    out.append('\n\n')
+    return "".join(out + body)
+
+
+def _source_repr(value, argname, imports):
+    """Returns a Python expression that evaluates to the given value.
+
+    :param value: a resolved keyword argument to `add_argument`
+    :param argname: the argument name (used for error reporting)
+    :param imports: a set of import statements, which any imports the
+    expression needs are added to
+    """
+    if isinstance(value, Choices):
+        if value.path is not None:
+            imports.add('from argutils.spec import Choices')
+            return 'Choices(path={0!r}, arg_type={1})'.format(
+                value.path, _source_repr(value._type, argname, imports))
+        elif value.summary() is not None:
+            imports.add('from argutils.spec import Choices')
+            return 'Choices({0!r})'.format(value.values)
+        return repr(value.values)
+    elif value is sys.stdin:
+        return 'sys.stdin'
+    elif value is sys.stdout:
+        return 'sys.stdout'
+    elif value is getattr(sys.stdin, 'buffer', None):
+        return 'sys.stdin.buffer'
+    elif value is getattr(sys.stdout, 'buffer', None):
+        return 'sys.stdout.buffer'
+    elif isinstance(value, argparse.FileType):
+        return 'argparse.' + repr(value)
+    elif isinstance(value, (ArrayType, LazyFileType, MmapType)):
+        imports.add('from argutils.types import ' + type(value).__name__)
+        return repr(value)
+    elif (value is ArrayAction or value is ArgfileAction
+          or value is ChoicesAction):
+        imports.add('from {0} import {1}'.format(
+            value.__module__, value.__name__))
+        return value.__name__
+    elif isinstance(value, type):
+        if getattr(builtins, value.__name__, None) is not value:
+            raise ValueError(
+                "Cannot generate source for the type of `{}`: {}"
+                .format(argname, value)
+            )
+        return value.__name__
+    return repr(value)
+
+
+def to_completion(cmd_name, argsdict, shell):
+    """Create a static shell completion script from a dictionary of arguments.
+
+    The script completes option names, the values listed in `choices`, and
+    filenames for file arguments, without running Python on each TAB.
+
+    :param cmd_name: name of the command, as typed in the shell
+    :param argsdict: a dictionary of arguments, as provided by argutils.read.*
+    :param shell: one of 'bash', 'zsh' or 'fish'
+    :returns: the completion script as a string
+    """
+    try:
+        func = _COMPLETION_FUNCS[shell]
+    except KeyError:
+        raise ValueError("Unsupported shell: {0}".format(shell))
+    return func(cmd_name, argsdict)
+
+
+def to_bash_completion(cmd_name, argsdict):
+    """Create a bash completion script (see `to_completion`)."""
+    args = _completion_args(argsdict)
+    func_name = "_argutils_" + re.sub(r'\W', '_', cmd_name)
+    options = ['-h', '--help'] + [
+        arg.flag for arg in args if arg.argtype != 'arg']
+
+    out = [
+        "# bash completion for {0}\n".format(cmd_name),
+        "# Generated by argutils.export.to_bash_completion; do not edit.\n",
+        "{0}() {{\n".format(func_name),
+        '    local cur="${COMP_WORDS[COMP_CWORD]}"\n',
+        '    local prev="${COMP_WORDS[COMP_CWORD-1]}"\n',
+        '    case "$prev" in\n',
+    ]
+    for arg in args:
+        if arg.argtype in ('arg', 'flag'):
+            continue
+        if arg.choices is not None and arg.choices.path is not None:
+            reply = '$(compgen -W "$({0})" -- "$cur")'.format(
+                _choices_file_command(arg))
+        elif arg.choices:
+            words = " ".join(str(choice) for choice in arg.choices)
+            reply = "$(compgen -W {0} -- \"$cur\")".format(_sh_quote(words))
+        elif _is_file_arg(arg):
+            reply = '$(compgen -f -- "$cur")'
+        else:
+            continue
+        out.append("        {0})\n".format(_sh_quote(arg.flag)))
+        out.append("            COMPREPLY=({0})\n".format(reply))
+        out.append("            return 0;;\n")
+    out.extend([
+        '    esac\n',
+        '    if [[ "$cur" == -* ]]; then\n',
+        '        COMPREPLY=($(compgen -W {0} -- "$cur"))\n'.format(
+            _sh_quote(" ".join(options))),
+        '        return 0\n',
+        '    fi\n',
+        '    COMPREPLY=()\n',
+        '}\n',
+        # -o default falls back to filename completion when nothing matches
+        'complete -o default -F {0} {1}\n'.format(
+            func_name, _sh_quote(cmd_name)),
+    ])
+    return "".join(out)
+
+
+def to_zsh_completion(cmd_name, argsdict):
+    """Create a zsh completion script (see `to_completion`)."""
+    out = [
+        "#compdef {0}\n".format(cmd_name),
+        "# Generated by argutils.export.to_zsh_completion; do not edit.\n",
+        "_arguments \\\n",
+        "  '(- *)'{-h,--help}'[show this help message and exit]' \\\n",
+    ]
+    specs = []
+    for arg in _completion_args(argsdict):
+        _help = _zsh_escape(_first_line(arg.help))
+        if arg.choices is not None and arg.choices.path is not None:
+            action = '{{compadd -- ${{(f)"$({0})"}}}}'.format(
+                _choices_file_command(arg))
+        elif arg.choices:
+            action = "({0})".format(" ".join(
+                _zsh_escape(str(choice), r'\\: ()') for choice in arg.choices))
+        elif _is_file_arg(arg):
+            action = "_files"
+        else:
+            action = ""
+        if arg.argtype == 'arg':
+            repeat = "*" if arg.nargs in ('*', '+') else ""
+            specs.append("{0}:{1}:{2}".format(repeat, arg.name, action))
+        elif arg.argtype == 'flag':
+            specs.append("{0}[{1}]".format(arg.flag, _help))
+        else:
+            specs.append("{0}[{1}]:{2}:{3}".format(
+                arg.flag, _help, arg.name, action))
+    out.extend("  {0} \\\n".format(_sh_quote(spec)) for spec in specs)
+    out.append("  && return 0\n")
+    return "".join(out)
+
+
+def to_fish_completion(cmd_name, argsdict):
+    """Create a fish completion script (see `to_completion`)."""
+    out = [
+        "# fish completion for {0}\n".format(cmd_name),
+        "# Generated by argutils.export.to_fish_completion; do not edit.\n",
+        "complete -c {0} -s h -l help -d 'show this help message and exit'\n"
+        .format(_sh_quote(cmd_name)),
+    ]
+    for arg in _completion_args(argsdict):
+        if arg.argtype == 'arg':
+            if _is_file_arg(arg):
+                out.append("complete -c {0} -F\n".format(_sh_quote(cmd_name)))
+            continue
+        name = arg.flag.lstrip('-')
+        if arg.flag.startswith('--'):
+            parts = ["-l", _sh_quote(name)]
+        elif len(name) == 1:
+            parts = ["-s", _sh_quote(name)]
+        else:
+            parts = ["-o", _sh_quote(name)]
+        _help = _first_line(arg.help)
+        if _help:
+            parts.extend(["-d", _sh_quote(_help)])
+        if arg.argtype != 'flag':
+            if arg.choices is not None and arg.choices.path is not None:
+                parts.extend(["-x", "-a", _sh_quote(
+                    "({0})".format(_choices_file_command(arg)))])
+            elif arg.choices:
+                parts.extend(["-x", "-a", _sh_quote(
+                    " ".join(str(choice) for choice in arg.choices))])
+            elif _is_file_arg(arg):
+                parts.extend(["-r", "-F"])
+            else:
+                parts.append("-r")
+        out.append("complete -c {0} {1}\n".format(
+            _sh_quote(cmd_name), " ".join(parts)))
+    return "".join(out)
+
+
+_COMPLETION_FUNCS = {
+    'bash': to_bash_completion,
+    'zsh': to_zsh_completion,
+    'fish': to_fish_completion,
+}
+
+
+def _completion_args(argsdict):
+    """Returns the ArgSpecs for every argument in an argsdict."""
+    return [
+        argvals if isinstance(argvals, ArgSpec) else ArgSpec(argname, argvals)
+        for argname, argvals in argsdict.items() if argname != META_KEY]
+
+
+def _choices_file_command(arg):
+    """Returns a shell command listing an argument's file-backed choices, so
+    the completion script reads the file instead of copying it."""
+    import os
+    return 'grep -v "^#" "{0}" 2>/dev/null'.format(
+        os.path.abspath(arg.choices.path))
+
+
+def _is_file_arg(arg):
+    return isinstance(arg.type, (argparse.FileType, LazyFileType, MmapType))
+
+
+def _first_line(text):
+    return " ".join(str(text or "").split())
+
+
+def _sh_quote(text):
+    """Quotes a string for use as a single shell word."""
+    if re.match(r'^[\w@%+=:,./-]+$', text):
+        return text
+    return "'" + text.replace("'", "'\\''") + "'"
+
+
+def _zsh_escape(text, special=r'\[]'):
+    """Backslash-escapes characters that are special in `_arguments` specs.
+
+    :param text: the text to escape
+    :param special: the characters to escape (by default, those special in
+    option descriptions)
+    """
+    return "".join("\\" + c if c in special else c for c in text)
+
+
+@timed('export.to_argparser')
+def to_argparser(cmd_name, argsdict, desc=None, config=None,
+                 parser_class=argparse.ArgumentParser, rendered_help=None):
     """Create an ArgumentParser from the given dictionary of arguments.
 
     :param cmd_name: name of the command
@@ -90,6 +399,10 @@ def to_argparser(cmd_name, argsdict, desc=None, config=None):
     :param desc: (optional) a description of the command, if one is not provided
     by argsdict.
     :param config: a ConfigParser object populated with defaults
+    :param parser_class: (optional) the ArgumentParser subclass to create
+    :param rendered_help: (optional) help text from `render_help`. It is
+    printed for --help as-is, unless it was rendered from a different spec or
+    for a different terminal width.
     :returns: An ArgumentParser with the specified options and args
     """
     # If there's a metadata section, get the description from there, otherwise
@@ -98,131 +411,230 @@ def to_argparser(cmd_name, argsdict, desc=None, config=None):
         cmd_desc = argsdict[META_KEY].get(DESC_KEY, desc)
     else:
         cmd_desc = desc
-    parser = argparse.ArgumentParser(prog=cmd_name, description=cmd_desc)
+    parser = parser_class(prog=cmd_name, description=cmd_desc)
 
-    for argname, argvals in six.iteritems(argsdict):
+    for argname, argvals in argsdict.items():
         if argname == META_KEY:
             continue
         parser = _add_argument(argname, argvals, parser) 
 
+    if rendered_help is not None:
+        # Checked when the help is formatted, so that building the parser
+        # doesn't pay for hashing the spec
+        parser.format_help = functools.partial(
+            _format_rendered_help, rendered_help, (cmd_name, argsdict, desc),
+            parser.format_help)
     return parser
 
 
-def _add_argument(argname, argvals, parser):
-    """Adds an argument to the parser from a given set of argument values.
+def render_help(cmd_name, argsdict, desc=None, width=None):
+    """Render the --help text for a spec ahead of time.
 
-    :param argname: the name of the argument
-    :param argvals: the options for the argument
-    :param parser: the ArgumentParser to add the argument to
-    :returns: the ArgumentParser passed in
-    """
-    action = argvals.get('action', 'store')
-    prefix = argvals.get('prefix', '--')
-    _help = argvals.get(DESC_KEY, '')
+    The result can be stored (it's a plain, picklable dict) and passed to
+    `to_argparser` to skip formatting the help at runtime. It records a
+    digest of the spec and the width it was rendered for, so the parser only
+    uses it if both still match.
 
-    nargs = argvals.get('nargs', None)
+    :param cmd_name: name of the command
+    :param argsdict: a dictionary of arguments, as provided by argutils.read.*
+    :param desc: (optional) a description of the command, if one is not provided
+    by argsdict.
+    :param width: (optional) the width to render for (default: the width
+    argparse would use for the current terminal)
+    :returns: a dict with the keys 'digest', 'width' and 'text'
+    """
+    from argutils.cache import spec_digest
+    if width is None:
+        width = _help_width()
+    parser = to_argparser(cmd_name, argsdict, desc)
+    parser.formatter_class = functools.partial(
+        argparse.HelpFormatter, width=width)
+    return {
+        'digest': spec_digest(cmd_name, argsdict, desc),
+        'width': width,
+        'text': parser.format_help(),
+    }
+
+
+def _help_width():
+    """Returns the width argparse's HelpFormatter wraps help text to."""
     try:
-        nargs = int(nargs) if nargs else nargs
-    except ValueError:
-        nargs = nargs if nargs in ['+', '?', '*', argparse.REMAINDER] else None
-
-    # We only use a non-False default value for stdin/stdout options,
-    # all other options pull the default values from the config file
-    default = argvals.get('default')
-    if default == 'stdin':
-        default = sys.stdin
-    elif default == 'stdout':
-        default = sys.stdout
+        from shutil import get_terminal_size
+    except ImportError:
+        import os
+        try:
+            columns = int(os.environ['COLUMNS'])
+        except (KeyError, ValueError):
+            columns = 80
     else:
-        default = default if default else None
+        columns = get_terminal_size().columns
+    return columns - 2
 
-    # What kind of values can the argument take? We generally just evaluate
-    # the type provided as a string, except for FileTypes which we handle 
-    # specially
-    _type = _parse_type(argvals.get('type'), argname)
 
-    # Choices should be a container. We'll just split on commas and coerce to
-    # the same type as defined above
-    choices = _parse_choices(argvals.get('choices', None), _type)
+def _format_rendered_help(rendered_help, spec, format_help):
+    """Returns the pre-rendered help if it was rendered from `spec` (the
+    arguments to `to_argparser`) for the current width."""
+    from argutils.cache import spec_digest
+    if (rendered_help['width'] == _help_width() and
+            rendered_help['digest'] == spec_digest(*spec)):
+        return rendered_help['text']
+    return format_help()
 
-    # There are three types of options allowed:
-    # 'arg': positional arguments, which are required,
-    # 'opt': options, which are optional, and
-    # 'flag': flags, which do not take values after them
-    argtype = argvals.get('argtype', 'opt')
-    if argtype == 'arg':
-        prefix = ''
 
-    # The final constructor operation is different depending on the situation.
-    # Case 1: It's a flag option, in which case we omit most of the parameters
-    if argtype == 'flag':
-        parser.add_argument(
-            prefix + argname,
-            action='store_true',
-            help=_help)
-    # Case 2: It's a normal argument with a default value of stdin/stdout
-    elif default:
-        parser.add_argument(
-            prefix + argname,
-            action=action,
-            nargs=nargs,
-            choices=choices,
-            default=default,
-            type=_type,
-            help=_help)
-    # Case 3: It's a normal argument with no default specified. Passing None
-    # as the default conflicts with specifying a type, so we need to omit it
-    # from the constructor entirely instead.
-    else:
-        parser.add_argument(
-            prefix + argname,
-            action=action,
-            nargs=nargs,
-            choices=choices,
-            type=_type,
-            help=_help)
+def to_fastparser(cmd_name, argsdict, desc=None):
+    """Create a fast-path parser for simple specs, or an ArgumentParser.
+
+    Specs that only use flags, typed options and single positional arguments
+    get an `argutils.fastparse.FastParser`, which parses argv without going
+    through argparse but gives the same Namespace; errors and --help are still
+    handled by argparse. Any other spec gets the parser from `to_argparser`.
+
+    :param cmd_name: name of the command
+    :param argsdict: a dictionary of arguments, as provided by argutils.read.*
+    :param desc: (optional) a description of the command, if one is not provided
+    by argsdict.
+    :returns: a FastParser or ArgumentParser
+    """
+    from argutils.fastparse import FastParser
+    parser = FastParser.build(cmd_name, argsdict, desc)
+    if parser is None:
+        parser = to_argparser(cmd_name, argsdict, desc)
     return parser
 
-def _parse_type(typestr, argname):
-    """Parses the type from a string. 
 
-    :param typestr: a string coercible to a type or argparse.FileType. If None 
-    or an empty string, the default is `str`.
-    :param argname: the argument name (used for error reporting)
-    :returns: the actual type found (i.e. `int`, `str`, argparse.FileType('w'))
+def to_multi_argparser(cmd_name, commands, desc=None, config=None):
+    """Create an ArgumentParser with a subcommand for each command in a spec.
+
+    Multi-command specs map each command name to its own dictionary of
+    arguments (as accepted by `to_argparser`); a top-level `_meta` section
+    holds the program description. A command's arguments are only added when
+    it's named on the command line being parsed, so programs with many
+    commands don't pay to build parsers they won't use. The chosen command is
+    stored in `args.command`.
+
+    :param cmd_name: name of the program
+    :param commands: a dictionary of commands to dictionaries of arguments, or
+    an IndexedSpec (see `argutils.read.indexed`)
+    :param desc: (optional) a description of the program, if one is not
+    provided by the spec
+    :param config: a ConfigParser object populated with defaults; each
+    command's defaults are read from the section with the command's name
+    :returns: An ArgumentParser with a subparser for each command
     """
-    if typestr == FILE_R:
-        return argparse.FileType('r')
-    elif typestr == FILE_W:
-        return argparse.FileType('w')
-    elif typestr:
-        try:
-            return getattr(builtins, typestr)
-        except AttributeError:
-            raise ValueError(
-                "Invalid type specified for `{}`: {}"
-                .format(argname, typestr)
-            )
+    if META_KEY in commands:
+        cmd_desc = commands[META_KEY].get(DESC_KEY, desc)
     else:
-        return str
+        cmd_desc = desc
+    parser = argparse.ArgumentParser(prog=cmd_name, description=cmd_desc)
+    subparsers = parser.add_subparsers(
+        dest='command', metavar='command', action=_CommandsAction,
+        commands=commands, config=config)
+    subparsers.required = True
+
+    for name in commands.keys():
+        if name == META_KEY:
+            continue
+        _help = _command_help(commands, name)
+        subparsers.add_parser(name, help=_help, description=_help)
+
+    return parser
 
-def _parse_choices(choices_str, arg_type):
-    """Parses the choices for an argument from a comma-separated string.
 
-    :param choices_str: a comma-separated list of options
-    :param arg_type: a type to coerce each choice to; will throw an exception
-    if the coercion fails.
-    :returns: a list of choices of the specified type
+class _CommandsAction(argparse._SubParsersAction):
+    """Adds a command's arguments to its subparser when the command is
+    parsed, the first time it's used.
+
+    :param commands: a dictionary of commands to dictionaries of arguments
+    :param config: a ConfigParser object populated with defaults, or None
     """
 
-    if not choices_str:
-        return None
-    else:
-        choices = [c.strip() for c in choices_str.split(",")]
-        try:
-            choices = [arg_type(c) for c in choices]
-            return choices
-        except (ValueError, argparse.ArgumentTypeError) as err:
-            warnings.warn("Could not coerce choice(s) to given type!")
-            raise err
+    def __init__(self, option_strings, commands=None, config=None, **kwargs):
+        self.commands = commands
+        self.config = config
+        self._built = set()
+        super(_CommandsAction, self).__init__(option_strings, **kwargs)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        name = values[0]
+        if name in self.choices and name not in self._built:
+            self._built.add(name)
+            subparser = self.choices[name]
+            for argname, argvals in self.commands[name].items():
+                if argname == META_KEY:
+                    continue
+                subparser = _add_argument(argname, argvals, subparser)
+            if self.config is not None:
+                set_parser_defaults(subparser, self.config, section=name)
+        super(_CommandsAction, self).__call__(
+            parser, namespace, values, option_string)
+
+
+def _command_help(commands, name):
+    """Returns a command's help, without reading the command if `commands`
+    is an argutils.index.IndexedSpec."""
+    command_help = getattr(commands, 'command_help', None)
+    if command_help is not None:
+        return command_help(name)
+    return commands[name].get(META_KEY, {}).get(DESC_KEY)
+
+
+@timed('export._add_argument', detail_arg=0)
+def _add_argument(argname, argvals, parser):
+    """Adds an argument to the parser from a given set of argument values.
 
+    :param argname: the name of the argument
+    :param argvals: the options for the argument
+    :param parser: the ArgumentParser to add the argument to
+    :returns: the ArgumentParser passed in
+    """
+    flag, kwargs = _argument_spec(argname, argvals)
+    parser.add_argument(flag, **kwargs)
+    return parser
+
+
+def _argument_spec(argname, argvals):
+    """Resolves the arguments to pass to `ArgumentParser.add_argument`.
+
+    :param argname: the name of the argument
+    :param argvals: the options for the argument, or an ArgSpec
+    :returns: a tuple of the option string and a dict of keyword arguments
+    """
+    if not isinstance(argvals, ArgSpec):
+        argvals = ArgSpec(argname, argvals)
+    action = argvals.action
+    if argvals.metavar is not None and action == 'store':
+        # Choices summarized in --help are checked by the action instead, so
+        # that argparse's error message doesn't list every value
+        action = ChoicesAction
+
+    # The final constructor operation is different depending on the situation.
+    # Case 1: It's a flag option, in which case we omit most of the parameters
+    if argvals.argtype == 'flag':
+        kwargs = OrderedDict([
+            ('action', 'store_true'),
+            ('help', argvals.help)])
+    # Case 2: It's a normal argument with a default value of stdin/stdout (or
+    # an array type's default, which ArrayAction converts)
+    elif argvals.default is not None:
+        kwargs = OrderedDict([
+            ('action', action),
+            ('nargs', argvals.nargs),
+            ('choices', argvals.choices),
+            ('default', _resolve_default(argvals.default, argvals.type)),
+            ('type', argvals.type),
+            ('help', argvals.help)])
+    # Case 3: It's a normal argument with no default specified. Passing None
+    # as the default conflicts with specifying a type, so we need to omit it
+    # from the constructor entirely instead.
+    else:
+        kwargs = OrderedDict([
+            ('action', action),
+            ('nargs', argvals.nargs),
+            ('choices', argvals.choices),
+            ('type', argvals.type),
+            ('help', argvals.help)])
+    if argvals.metavar is not None and argvals.argtype != 'flag':
+        kwargs['metavar'] = argvals.metavar
+    if argvals.argfile is not None and argvals.argtype != 'flag':
+        kwargs['argfile_prefix'] = argvals.argfile
+    return argvals.flag, kwargs
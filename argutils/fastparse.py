@@ -0,0 +1,238 @@
+"""A fast-path command line parser for simple argument specs.
+
+For specs made up only of flags, typed options and single positional
+arguments, `FastParser` parses argv with a precomputed lookup table instead of
+argparse's general machinery, and returns the same Namespace argparse would.
+Anything it doesn't handle itself, including every kind of error and --help,
+is passed on to the equivalent ArgumentParser, so behavior and error messages
+stay the same.
+"""
+import argparse
+import sys
+
+from argutils import META_KEY, DESC_KEY
+from argutils import export
+
+# Marks prefixes shared by more than one option in the lookup table
+_AMBIGUOUS = object()
+_HELP_OPTIONS = ('-h', '--help')
+
+
+class _Fallback(Exception):
+    """Raised when the fast path can't handle the given arguments."""
+
+
+class _Action(object):
+    """The parts of an argparse action the fast path needs."""
+    __slots__ = ('dest', 'flag', 'type', 'default')
+
+    def __init__(self, dest, flag, _type, default):
+        self.dest = dest
+        self.flag = flag
+        self.type = _type
+        self.default = default
+
+
+class FastParser(object):
+    """Parses command lines for a simple argsdict without argparse.
+
+    Use `build` (or `argutils.export.to_fastparser`) rather than creating
+    these directly. Unknown attributes are looked up on the equivalent
+    ArgumentParser, which is only built when it's first needed.
+    """
+
+    def __init__(self, prog, description, argsdict, options, positionals):
+        self.prog = prog
+        self.description = description
+        self._argsdict = argsdict
+        self._actions_by_prefix = _prefix_table(options)
+        self._positionals = positionals
+        self._actions = list(options.values()) + positionals
+        self._defaults = {}
+        self._parser = None
+
+    @classmethod
+    def build(cls, cmd_name, argsdict, desc=None):
+        """Builds a FastParser, or returns None if the spec isn't supported.
+
+        :param cmd_name: name of the command
+        :param argsdict: a dictionary of arguments, as provided by
+        argutils.read.*
+        :param desc: (optional) a description of the command, if one is not
+        provided by argsdict.
+        """
+        if META_KEY in argsdict:
+            cmd_desc = argsdict[META_KEY].get(DESC_KEY, desc)
+        else:
+            cmd_desc = desc
+
+        actions = {}
+        positionals = []
+        for argname, argvals in argsdict.items():
+            if argname == META_KEY:
+                continue
+            flag, kwargs = export._argument_spec(argname, argvals)
+            action = _make_action(flag, kwargs)
+            if action is None:
+                return None
+            if flag.startswith('-'):
+                if flag in actions or flag in _HELP_OPTIONS:
+                    return None
+                actions[flag] = action
+            else:
+                positionals.append(action)
+        return cls(cmd_name, cmd_desc, argsdict, actions, positionals)
+
+    def set_defaults(self, **kwargs):
+        """Sets defaults, as `ArgumentParser.set_defaults` does."""
+        self._defaults.update(kwargs)
+        if self._parser is not None:
+            self._parser.set_defaults(**kwargs)
+
+    def parse_args(self, args=None, namespace=None):
+        """Parses the arguments into a Namespace.
+
+        :param args: the arguments to parse (default: sys.argv[1:])
+        :param namespace: (optional) an object to hold the attributes; if
+        given, parsing is always done by argparse
+        """
+        if args is None:
+            args = sys.argv[1:]
+        else:
+            args = list(args)
+        if namespace is None:
+            try:
+                return self._parse(args)
+            except _Fallback:
+                pass
+        return self.argparser.parse_args(args, namespace)
+
+    @property
+    def argparser(self):
+        """The equivalent ArgumentParser, built on first use."""
+        if self._parser is None:
+            parser = export.to_argparser(
+                self.prog, self._argsdict, self.description)
+            if self._defaults:
+                parser.set_defaults(**self._defaults)
+            self._parser = parser
+        return self._parser
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.argparser, name)
+
+    def _parse(self, args):
+        options = self._actions_by_prefix
+        positionals = iter(self._positionals)
+        seen = {}
+        i = 0
+        while i < len(args):
+            token = args[i]
+            i += 1
+            if token.startswith('-') and token != '-':
+                option, eq, value = token.partition('=')
+                if not token.startswith('--'):
+                    option, eq, value = token, '', ''
+                action = options.get(option)
+                if action is None or action is _AMBIGUOUS:
+                    raise _Fallback()
+                if action.flag:
+                    if eq:
+                        raise _Fallback()
+                    seen[action.dest] = True
+                    continue
+                if not eq:
+                    if i >= len(args):
+                        raise _Fallback()
+                    value = args[i]
+                    i += 1
+                    if value.startswith('-') and value != '-':
+                        raise _Fallback()
+                seen[action.dest] = _convert(action, value)
+            else:
+                action = next(positionals, None)
+                if action is None:
+                    raise _Fallback()
+                seen[action.dest] = _convert(action, token)
+        if next(positionals, None) is not None:
+            # Missing required positional arguments
+            raise _Fallback()
+
+        namespace = argparse.Namespace()
+        for action in self._actions:
+            if action.dest in seen:
+                value = seen[action.dest]
+            else:
+                value = self._defaults.get(action.dest, action.default)
+                # argparse converts string defaults using the argument's type
+                if isinstance(value, str) and action.type is not None:
+                    value = _convert(action, value)
+            setattr(namespace, action.dest, value)
+        for dest, value in self._defaults.items():
+            if not hasattr(namespace, dest):
+                setattr(namespace, dest, value)
+        return namespace
+
+
+def _make_action(flag, kwargs):
+    """Returns an _Action for the add_argument arguments, or None if the
+    fast path doesn't support them."""
+    if kwargs['action'] == 'store_true':
+        if not flag.startswith('--'):
+            return None
+        return _Action(_dest(flag), True, None, False)
+    if kwargs['action'] != 'store' or kwargs.get('nargs') is not None:
+        return None
+    if kwargs.get('choices') is not None:
+        return None
+    _type = kwargs.get('type')
+    if not isinstance(_type, type) or _type.__module__ not in (
+            'builtins', '__builtin__'):
+        return None
+    if flag.startswith('-'):
+        if not flag.startswith('--') or len(flag) < 3:
+            return None
+        return _Action(_dest(flag), False, _type, kwargs.get('default'))
+    return _Action(flag, False, _type, kwargs.get('default'))
+
+
+def _dest(flag):
+    return flag.lstrip('-').replace('-', '_')
+
+
+def _prefix_table(actions):
+    """Maps every option string and unambiguous abbreviation to its action.
+
+    argparse accepts any unambiguous prefix of a long option, so this lists
+    them all up front. The help options map to None so that they're handed to
+    argparse.
+
+    :param actions: a dict of option strings to _Actions
+    """
+    table = dict(actions)
+    for option in _HELP_OPTIONS:
+        table[option] = None
+    abbrevs = {}
+    for option in table:
+        if not option.startswith('--'):
+            continue
+        for end in range(3, len(option)):
+            prefix = option[:end]
+            if prefix in abbrevs and abbrevs[prefix] != option:
+                abbrevs[prefix] = _AMBIGUOUS
+            else:
+                abbrevs[prefix] = option
+    for prefix, option in abbrevs.items():
+        if prefix in table:
+            continue
+        table[prefix] = _AMBIGUOUS if option is _AMBIGUOUS else table[option]
+    return table
+
+
+def _convert(action, value):
+    try:
+        return action.type(value)
+    except (TypeError, ValueError, argparse.ArgumentTypeError):
+        raise _Fallback()
@@ -0,0 +1,335 @@
+"""Byte-offset indexes of multi-command spec files.
+
+A multi-command spec can hold hundreds of commands, while a process usually
+needs only one. The index records where each top-level command starts and
+ends in the file, so that `IndexedSpec` (or `read.load_command`) can read and
+parse just the bytes of the command it needs. Indexes are built the first
+time a spec is read and stored next to it (as `<spec>.idx`), or in the cache
+directory if the spec's directory isn't writable; they're rebuilt whenever
+the spec's modification time or size changes.
+
+YAML specs that use anchors and aliases (which can refer across commands),
+flow-style top-level mappings or several documents can't be split up, and
+are read in full instead.
+"""
+import json
+import os
+
+from argutils import cache, read, META_KEY, DESC_KEY
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".idx"
+
+
+class IndexedSpec(object):
+    """A multi-command spec that parses each command only when it's used.
+
+    IndexedSpecs can be passed to `export.to_multi_argparser` in place of a
+    dictionary of commands; only the selected command (and the top-level
+    `_meta` section) is read from the file.
+
+    :param filename: path to a JSON or YAML multi-command spec
+    :param fmt: (optional) 'json' or 'yaml'; by default this is guessed from
+    the file extension
+    :param index_path: (optional) where to store the index (default: the
+    spec's path with '.idx' appended, or else a file in the cache directory)
+    """
+
+    def __init__(self, filename, fmt=None, index_path=None):
+        self.filename = os.path.abspath(filename)
+        self.fmt = fmt or guess_format(filename)
+        self.index = load_index(self.filename, self.fmt, index_path)
+        self._entries = None
+        if self.index['commands'] is not None:
+            self._entries = dict(
+                (name, (start, end, _help))
+                for name, start, end, _help in self.index['commands'])
+        self._loaded = {}
+
+    def _all(self):
+        if 'all' not in self._loaded:
+            with open(self.filename, 'rb') as infile:
+                self._loaded['all'] = read._resolve_paths(
+                    _loader(self.fmt)(infile.read().decode('utf-8')),
+                    os.path.dirname(self.filename))
+        return self._loaded['all']
+
+    def __getitem__(self, name):
+        if self._entries is None:
+            return self._all()[name]
+        if name not in self._loaded:
+            start, end, _ = self._entries[name]
+            self._loaded[name] = load_chunk(self.filename, self.fmt,
+                                            name, start, end)
+        return self._loaded[name]
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def command_help(self, name):
+        """Returns the help text of a command, without reading the command."""
+        if self._entries is None:
+            return self._all()[name].get(META_KEY, {}).get(DESC_KEY)
+        return self._entries[name][2]
+
+    def keys(self):
+        if self._entries is None:
+            return list(self._all().keys())
+        return [name for name, _, _, _ in self.index['commands']]
+
+    def items(self):
+        return [(name, self[name]) for name in self.keys()]
+
+    def values(self):
+        return [self[name] for name in self.keys()]
+
+    def __contains__(self, name):
+        if self._entries is None:
+            return name in self._all()
+        return name in self._entries
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __repr__(self):
+        return "IndexedSpec({0!r})".format(self.filename)
+
+
+def guess_format(filename):
+    """Returns 'json' for .json files and 'yaml' for anything else."""
+    return 'json' if filename.lower().endswith('.json') else 'yaml'
+
+
+def load_index(filename, fmt=None, index_path=None):
+    """Reads the index of a spec file, building and storing it if it's
+    missing or out of date.
+
+    :param filename: path to the spec file
+    :param fmt: (optional) 'json' or 'yaml'
+    :param index_path: (optional) where the index is stored
+    :returns: the index, as a dict
+    """
+    fmt = fmt or guess_format(filename)
+    if index_path is not None:
+        index_paths = [index_path]
+    else:
+        # Specs in read-only directories (i.e. installed with a package) have
+        # their index kept in the cache directory instead
+        index_paths = [filename + INDEX_SUFFIX, _cached_index_path(filename)]
+    signature = list(cache.file_signature(filename))
+    for path in index_paths:
+        try:
+            with open(path) as index_file:
+                index = json.load(index_file)
+            if (index.get('version') == INDEX_VERSION and
+                    index.get('signature') == signature and
+                    index.get('format') == fmt):
+                return index
+        except (IOError, OSError, ValueError, AttributeError):
+            pass
+    index = build_index(filename, fmt)
+    for path in index_paths:
+        if _write_index(path, index):
+            break
+    return index
+
+
+def _cached_index_path(filename):
+    """Returns where the index of a spec is kept in the cache directory."""
+    name = cache.content_digest(os.path.abspath(filename).encode('utf-8'))
+    return os.path.join(
+        cache.default_cache_dir(), 'index', name + INDEX_SUFFIX)
+
+
+def build_index(filename, fmt=None):
+    """Finds the byte range of each top-level command in a spec file.
+
+    :param filename: path to the spec file
+    :param fmt: (optional) 'json' or 'yaml'
+    :returns: a dict holding the spec's signature, and under 'commands' a
+    list of (name, start, end, help) for each command, or None if the spec
+    can't be indexed
+    """
+    fmt = fmt or guess_format(filename)
+    signature = list(cache.file_signature(filename))
+    with open(filename, 'rb') as infile:
+        text = infile.read().decode('utf-8')
+    if fmt == 'json':
+        ranges, values = _json_ranges(text)
+    else:
+        ranges = _yaml_ranges(text)
+        values = read.from_yaml(text) if ranges is not None else None
+    commands = None
+    if ranges is not None:
+        offsets = _ByteOffsets(text)
+        commands = [
+            [name, offsets(start), offsets(end),
+             _command_help(name, values[name])]
+            for name, start, end in ranges]
+    return {'version': INDEX_VERSION, 'signature': signature,
+            'format': fmt, 'commands': commands}
+
+
+def load_chunk(filename, fmt, name, start, end):
+    """Reads and parses one command from a spec file.
+
+    :param filename: path to the spec file
+    :param fmt: 'json' or 'yaml'
+    :param name: the command's name
+    :param start: the byte offset the command starts at
+    :param end: the byte offset the command ends at
+    """
+    with open(filename, 'rb') as infile:
+        infile.seek(start)
+        chunk = infile.read(end - start).decode('utf-8')
+    if fmt == 'json':
+        # The chunk is just the command's value
+        command = read.from_json(chunk)
+    else:
+        # The chunk is a single-key mapping from the command's name
+        command = read.from_yaml(chunk)[name]
+    return read._resolve_paths(
+        command, os.path.dirname(os.path.abspath(filename)))
+
+
+def _loader(fmt):
+    return read.from_json if fmt == 'json' else read.from_yaml
+
+
+def _command_help(name, value):
+    if not isinstance(value, dict):
+        return None
+    if name != META_KEY:
+        value = value.get(META_KEY)
+    return value.get(DESC_KEY) if isinstance(value, dict) else None
+
+
+class _ByteOffsets(object):
+    """Converts increasing character offsets in a string to byte offsets in
+    its UTF-8 encoding."""
+
+    def __init__(self, text):
+        self.text = text
+        self.ascii = len(text.encode('utf-8')) == len(text)
+        self.char = 0
+        self.byte = 0
+
+    def __call__(self, char):
+        if self.ascii:
+            return char
+        if char < self.char:
+            self.char = self.byte = 0
+        self.byte += len(self.text[self.char:char].encode('utf-8'))
+        self.char = char
+        return self.byte
+
+
+def _json_ranges(text):
+    """Returns the character range of each top-level value in a JSON object,
+    and the parsed object."""
+    from collections import OrderedDict
+    from json.decoder import WHITESPACE
+    decoder = json.JSONDecoder(object_pairs_hook=OrderedDict)
+
+    def skip(pos):
+        return WHITESPACE.match(text, pos).end()
+
+    pos = skip(0)
+    if text[pos:pos + 1] != '{':
+        raise ValueError("Expected a JSON object in the spec")
+    pos = skip(pos + 1)
+    ranges = []
+    values = OrderedDict()
+    while text[pos:pos + 1] != '}':
+        name, pos = decoder.raw_decode(text, pos)
+        pos = skip(pos)
+        if text[pos:pos + 1] != ':':
+            raise ValueError("Expected ':' at character {0}".format(pos))
+        start = skip(pos + 1)
+        values[name], end = decoder.raw_decode(text, start)
+        ranges.append((name, start, end))
+        pos = skip(end)
+        if text[pos:pos + 1] == ',':
+            pos = skip(pos + 1)
+    return ranges, values
+
+
+def _yaml_ranges(text):
+    """Returns the character range of each top-level key and value in a YAML
+    mapping, or None if the commands can't be read separately."""
+    import yaml
+    events = yaml.parse(text, read._get_ordered_loader())
+    for event in events:
+        if isinstance(event, yaml.DocumentStartEvent):
+            break
+    event = next(events)
+    if not isinstance(event, yaml.MappingStartEvent) or event.flow_style:
+        return None
+
+    ranges = []
+    pending = None
+    for event in events:
+        if pending is not None:
+            # The previous command ends where this key (or the mapping) starts
+            ranges.append(pending + (event.start_mark.index,))
+        if isinstance(event, yaml.MappingEndEvent):
+            break
+        if not isinstance(event, yaml.ScalarEvent) or event.anchor:
+            return None
+        pending = (event.value, event.start_mark.index)
+        if not _skip_node(events):
+            return None
+    for event in events:
+        if isinstance(event, (yaml.DocumentStartEvent, yaml.AliasEvent)):
+            return None
+    return ranges
+
+
+def _skip_node(events):
+    """Consumes the events of one YAML node; returns False if the node has
+    anchors or aliases."""
+    import yaml
+    depth = 0
+    for event in events:
+        if isinstance(event, yaml.AliasEvent) or getattr(
+                event, 'anchor', None):
+            return False
+        if isinstance(event, (yaml.MappingStartEvent,
+                              yaml.SequenceStartEvent)):
+            depth += 1
+        elif isinstance(event, (yaml.MappingEndEvent,
+                                yaml.SequenceEndEvent)):
+            depth -= 1
+        if depth == 0:
+            return True
+    return False
+
+
+def _write_index(index_path, index):
+    """Atomically writes an index; failures are ignored, since the index is
+    only an optimization."""
+    import tempfile
+    index_dir = os.path.dirname(index_path) or '.'
+    try:
+        if not os.path.isdir(index_dir):
+            os.makedirs(index_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=index_dir, suffix=".tmp")
+    except OSError:
+        return False
+    try:
+        with os.fdopen(fd, 'w') as tmp_file:
+            json.dump(index, tmp_file)
+        os.rename(tmp_path, index_path)
+        return True
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
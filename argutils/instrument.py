@@ -0,0 +1,186 @@
+"""Opt-in timing of the phases of building a command-line interface.
+
+When enabled, reading a spec, building the parser (and each argument),
+applying config defaults and exporting config files are timed, along with
+the net number of memory blocks each left allocated (blocks allocated minus
+blocks freed, so it's not a measure of peak or temporary memory use). Enable
+it from code with `enable()` or `add_callback()`, or by setting the
+ARGUTILS_PROFILE environment variable to `table` or `json`, which prints a
+report to stderr on exit.
+
+When disabled, each instrumented call costs one global lookup.
+"""
+from __future__ import print_function
+import functools
+import os
+import sys
+import time
+
+PROFILE_ENV = "ARGUTILS_PROFILE"
+
+# Whether instrumented calls are timed at all (for records or callbacks)
+_enabled = False
+# Whether Records are kept; callbacks alone don't keep them, so long-running
+# processes that only use callbacks don't accumulate records
+_recording = False
+_callbacks = []
+_records = []
+
+# Both of these are only available on Python 3.3+
+_allocated_blocks = getattr(sys, 'getallocatedblocks', None)
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class Record(object):
+    """The timing of a single call to an instrumented function.
+
+    `net_blocks` is the change in `sys.getallocatedblocks()` over the call:
+    the memory blocks the call left allocated, less any it freed. It's None
+    where that isn't available.
+    """
+    __slots__ = ('phase', 'detail', 'seconds', 'net_blocks')
+
+    def __init__(self, phase, detail, seconds, net_blocks):
+        self.phase = phase
+        self.detail = detail
+        self.seconds = seconds
+        self.net_blocks = net_blocks
+
+    def to_dict(self):
+        return {'phase': self.phase, 'detail': self.detail,
+                'seconds': self.seconds, 'net_blocks': self.net_blocks}
+
+
+def enable():
+    """Starts recording instrumented calls."""
+    global _enabled, _recording
+    _enabled = _recording = True
+
+
+def disable():
+    """Stops recording instrumented calls and calling callbacks (existing
+    records are kept)."""
+    global _enabled, _recording
+    _enabled = _recording = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def add_callback(callback):
+    """Registers a function to call with each Record, and starts timing
+    instrumented calls. Records aren't kept for callbacks unless `enable` is
+    called too.
+
+    :param callback: a function taking a single Record
+    """
+    global _enabled
+    _callbacks.append(callback)
+    _enabled = True
+
+
+def remove_callback(callback):
+    """Unregisters a callback added with `add_callback`."""
+    global _enabled
+    _callbacks.remove(callback)
+    if not _callbacks and not _recording:
+        _enabled = False
+
+
+def records():
+    """Returns the Records collected so far."""
+    return list(_records)
+
+
+def clear():
+    """Discards the Records collected so far."""
+    del _records[:]
+
+
+def timed(phase, detail_arg=None):
+    """Decorator that records the time taken by each call to a function.
+
+    :param phase: the name the calls are recorded under
+    :param detail_arg: (optional) the index of a positional argument to
+    record alongside the phase (i.e. the argument name in `_add_argument`)
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            detail = None
+            if detail_arg is not None and len(args) > detail_arg:
+                detail = args[detail_arg]
+            blocks = _allocated_blocks() if _allocated_blocks else None
+            start = _clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds = _clock() - start
+                if blocks is not None:
+                    blocks = _allocated_blocks() - blocks
+                _record(Record(phase, detail, seconds, blocks))
+        return wrapper
+    return decorator
+
+
+def _record(record):
+    if _recording:
+        _records.append(record)
+    for callback in _callbacks:
+        callback(record)
+
+
+def summarize(recs=None):
+    """Totals the records for each phase.
+
+    :param recs: (optional) the records to summarize (default: all records)
+    :returns: a list of (phase, calls, total seconds, total net blocks),
+    slowest first
+    """
+    if recs is None:
+        recs = _records
+    totals = {}
+    for record in recs:
+        calls, seconds, blocks = totals.get(record.phase, (0, 0.0, None))
+        if record.net_blocks is not None:
+            blocks = (blocks or 0) + record.net_blocks
+        totals[record.phase] = (calls + 1, seconds + record.seconds, blocks)
+    rows = [(phase,) + total for phase, total in totals.items()]
+    return sorted(rows, key=lambda row: row[2], reverse=True)
+
+
+def report(fmt='table', recs=None):
+    """Formats the collected records.
+
+    :param fmt: 'table' for a per-phase summary, or 'json' for every record
+    :param recs: (optional) the records to report (default: all records)
+    :returns: the report as a string
+    """
+    if recs is None:
+        recs = _records
+    if fmt == 'json':
+        import json
+        return json.dumps([r.to_dict() for r in recs], indent=2)
+    elif fmt != 'table':
+        raise ValueError("Unknown report format: {0}".format(fmt))
+    lines = ["{0:<28} {1:>7} {2:>12} {3:>10}".format(
+        "phase", "calls", "total ms", "net blocks")]
+    for phase, calls, seconds, blocks in summarize(recs):
+        lines.append("{0:<28} {1:>7} {2:>12.3f} {3:>10}".format(
+            phase, calls, seconds * 1000, "-" if blocks is None else blocks))
+    return "\n".join(lines)
+
+
+def _report_at_exit(fmt):
+    print(report(fmt), file=sys.stderr)
+
+
+_env_fmt = os.environ.get(PROFILE_ENV)
+if _env_fmt:
+    import atexit
+    enable()
+    atexit.register(
+        _report_at_exit, 'json' if _env_fmt.lower() == 'json' else 'table')
@@ -1,38 +1,247 @@
-import json
-import yaml
+import os
 from collections import OrderedDict
+from argutils import cache
+from argutils.instrument import timed
 
+# json and yaml are imported on first use, so that importing this module stays
+# cheap for programs that only read one format (or read from a cache)
+_ordered_loader_cls = None
+
+@timed('read.from_json')
 def from_json(json_str):
 	"""Reads a JSON string into an OrderedDict.
 
-	:param json_str: a JSON string
+	:param json_str: a JSON string (or its UTF-8 encoded bytes)
 	:returns: an OrderedDict of the JSON contents
 	"""
+	import json
 	argsdict = json.loads(json_str, object_pairs_hook=OrderedDict)
 	return argsdict
 
+def _ordered_loader(base):
+	"""Builds a YAML loader class that reads mappings into OrderedDicts.
+
+	:param base: the loader class to extend (i.e. `yaml.SafeLoader`)
+	"""
+	import yaml
+	class OrderedLoader(base):
+		pass
+	def construct_mapping(loader, node):
+		loader.flatten_mapping(node)
+		return OrderedDict(loader.construct_pairs(node))
+	OrderedLoader.add_constructor(
+		yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
+		construct_mapping)
+	return OrderedLoader
+
+def _get_ordered_loader():
+	"""Returns the ordered YAML loader, building it on the first call.
+
+	Uses libyaml's loader when PyYAML was built with it.
+	"""
+	global _ordered_loader_cls
+	if _ordered_loader_cls is None:
+		import yaml
+		_ordered_loader_cls = _ordered_loader(
+			getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+	return _ordered_loader_cls
+
+@timed('read.from_yaml')
 def from_yaml(yaml_str):
 	"""Reads in a string of YAML into an OrderedDict.
 
 	:param yaml_str: the contents of a YAML file
 	:returns: an OrderedDict of the YAML contents
 	"""
-
-	def ordered_load(stream, Loader=yaml.Loader, object_pairs_hook=OrderedDict):
-		class OrderedLoader(Loader):
-			pass
-		def construct_mapping(loader, node):
-			loader.flatten_mapping(node)
-			return object_pairs_hook(loader.construct_pairs(node))
-		OrderedLoader.add_constructor(
-			yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
-			construct_mapping)
-		return yaml.load(stream, OrderedLoader)
-	# def _dict_constructor(loader, node):
-	# 	return OrderedDict(loader.construct_pairs(node))
-	# _mapping_tag = yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG
-	# yaml.add_constructor(_mapping_tag, _dict_constructor)
-
-	argsdict = ordered_load(yaml_str, yaml.SafeLoader)
+	import yaml
+	argsdict = yaml.load(yaml_str, _get_ordered_loader())
 	return argsdict
 
+@timed('read.cached')
+def cached(filename, loader=from_yaml, cache_dir=None):
+	"""Reads a spec file through an on-disk cache of its parsed contents.
+
+	Entries are keyed on the file's path and validated against its mtime and
+	size; if those have changed, the contents are hashed and only reparsed if
+	the hash differs too. Missing, stale or corrupt entries are rebuilt.
+
+	:param filename: path to a JSON or YAML spec file
+	:param loader: the function used to parse the file contents (i.e.
+	`from_yaml` or `from_json`)
+	:param cache_dir: where to store cache entries (default: see
+	`argutils.cache.default_cache_dir`)
+	:returns: an OrderedDict of the file contents
+	"""
+	namespace = getattr(loader, '__name__', repr(loader))
+	base_dir = os.path.dirname(os.path.abspath(filename))
+	return _cached(
+		filename, namespace,
+		lambda data: _resolve_paths(loader(data.decode('utf-8')), base_dir),
+		cache_dir)
+
+def _cached(filename, namespace, parse, cache_dir=None):
+	"""Parses a file with `parse` (given the file's bytes) through the cache.
+
+	:param namespace: a label for the kind of parsing done by `parse`
+	"""
+	cache_dir = cache_dir or cache.default_cache_dir()
+	filename = os.path.abspath(filename)
+	entry_fp = cache.entry_path(cache_dir, namespace, filename)
+
+	signature = cache.file_signature(filename)
+	entry = cache.read_entry(entry_fp)
+	if entry and entry.get('signature') == signature:
+		return entry['value']
+
+	with open(filename, 'rb') as infile:
+		data = infile.read()
+	digest = cache.content_digest(data)
+	if entry and entry.get('digest') == digest:
+		value = entry['value']
+	else:
+		value = parse(data)
+	cache.write_entry(
+		entry_fp, {'signature': signature, 'digest': digest, 'value': value})
+	return value
+
+def _resolve_paths(node, base_dir):
+	"""Resolves relative `choices_file` paths in a spec read from a file
+	against the file's directory, in place.
+
+	:param node: a spec, a multi-command spec or a single argument
+	:param base_dir: the directory of the spec file
+	:returns: the node
+	"""
+	if isinstance(node, dict):
+		path = node.get('choices_file')
+		if isinstance(path, str) and not os.path.isabs(path):
+			node['choices_file'] = os.path.join(base_dir, path)
+		for value in node.values():
+			_resolve_paths(value, base_dir)
+	return node
+
+# Compressed files are recognized by their extensions
+_COMPRESSION = (('.gz', 'gzip'), ('.bz2', 'bz2'))
+
+@timed('read.from_path')
+def from_path(filename, fmt=None, use_cache=False, cache_dir=None):
+	"""Reads a JSON or YAML spec file into an OrderedDict.
+
+	YAML is parsed as it's read from the file, and JSON from the file's bytes,
+	so the contents are never held as a separate decoded string. Files ending
+	in '.gz' or '.bz2' are decompressed as they're read.
+
+	:param filename: path to the spec file
+	:param fmt: (optional) 'json' or 'yaml'; by default this is guessed from
+	the extension ('.json', '.yaml' or '.yml', before any compression
+	extension), or else from the first character of the file
+	:param use_cache: if True, read the file through the cache used by
+	`cached`
+	:param cache_dir: where to store cache entries (default: see
+	`argutils.cache.default_cache_dir`)
+	:returns: an OrderedDict of the file contents
+	"""
+	compression = _compression(filename)
+	fmt = fmt or _format_from_name(filename)
+	base_dir = os.path.dirname(os.path.abspath(filename))
+	if use_cache:
+		return _cached(
+			filename, 'from_path:{0}:{1}'.format(fmt, compression),
+			lambda data: _resolve_paths(
+				_parse_bytes(data, fmt, compression), base_dir),
+			cache_dir)
+	with _open_path(filename, compression) as infile:
+		return _resolve_paths(_parse_stream(infile, fmt), base_dir)
+
+def _compression(filename):
+	for extension, compression in _COMPRESSION:
+		if filename.lower().endswith(extension):
+			return compression
+	return None
+
+def _format_from_name(filename):
+	"""Returns 'json' or 'yaml' from a file's extension, or None."""
+	name = filename.lower()
+	for extension, _ in _COMPRESSION:
+		if name.endswith(extension):
+			name = name[:-len(extension)]
+	if name.endswith('.json'):
+		return 'json'
+	elif name.endswith(('.yaml', '.yml')):
+		return 'yaml'
+	return None
+
+def _format_from_content(head):
+	"""Guesses the format from the first bytes of a file: JSON specs must be
+	objects, so anything not starting with '{' is read as YAML."""
+	head = head.lstrip(b'\xef\xbb\xbf \t\r\n')
+	return 'json' if head[:1] == b'{' else 'yaml'
+
+def _open_path(filename, compression):
+	if compression == 'gzip':
+		import gzip
+		return gzip.open(filename, 'rb')
+	elif compression == 'bz2':
+		import bz2
+		return bz2.BZ2File(filename, 'rb')
+	return open(filename, 'rb')
+
+def _parse_stream(infile, fmt):
+	"""Parses an open binary file."""
+	if fmt is None:
+		# Files can't be peeked at on Python 2, so the format is guessed
+		# from the contents once they've been read
+		data = infile.read()
+		fmt = _format_from_content(data[:64])
+		return from_json(data) if fmt == 'json' else from_yaml(data)
+	if fmt == 'json':
+		return from_json(infile.read())
+	return from_yaml(infile)
+
+def _parse_bytes(data, fmt, compression):
+	"""Parses the (possibly compressed) bytes of a file."""
+	import io
+	if compression is not None:
+		with _open_path(io.BytesIO(data), compression) as infile:
+			return _parse_stream(infile, fmt)
+	return _parse_stream(io.BytesIO(data), fmt)
+
+def indexed(filename, fmt=None):
+	"""Opens a multi-command spec file, reading each command only when it's
+	used.
+
+	:param filename: path to a JSON or YAML multi-command spec
+	:param fmt: (optional) 'json' or 'yaml'; by default this is guessed from
+	the file extension
+	:returns: an `argutils.index.IndexedSpec`, which can be used like the
+	dictionary of commands
+	"""
+	from argutils.index import IndexedSpec
+	return IndexedSpec(filename, fmt)
+
+def load_command(filename, command, fmt=None):
+	"""Reads a single command from a multi-command spec file.
+
+	Only the part of the file holding the command is parsed, using an index
+	of the file that's built on first use (see `argutils.index`).
+
+	:param filename: path to a JSON or YAML multi-command spec
+	:param command: the name of the command to read
+	:param fmt: (optional) 'json' or 'yaml'; by default this is guessed from
+	the file extension
+	:returns: an OrderedDict of the command's arguments
+	"""
+	return indexed(filename, fmt)[command]
+
+def composed(filename, fmt=None, use_cache=False, cache_dir=None):
+	"""Reads a spec file, resolving `$ref` and `$include` references to
+	shared files (see `argutils.compose`).
+
+	:param filename: path to a JSON or YAML spec file
+	:param fmt: (optional) 'json' or 'yaml' (see `from_path`)
+	:param use_cache: if True, files are parsed through the on-disk cache
+	:param cache_dir: where to store cache entries
+	:returns: an OrderedDict of the spec
+	"""
+	from argutils import compose
+	return compose.load(filename, fmt, use_cache, cache_dir)
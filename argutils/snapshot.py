@@ -0,0 +1,157 @@
+"""Picklable snapshots of parsed arguments.
+
+A Namespace from `to_argparser` can't be sent to another process if it holds
+open files (including the stdin/stdout defaults). `Snapshot.take` records
+each file as a FileRef holding only its path and mode, and `restore` opens
+the files again in the receiving process:
+
+    snap = Snapshot.take(parser.parse_args())
+    pool.map(work, [snap] * n)   # in each worker: args = snap.restore()
+"""
+import argparse
+import sys
+
+from argutils import types as _types
+from argutils.types import LazyFile, MmapType
+
+# Modes that would truncate or refuse an existing file are replaced when a
+# file is reopened, since it was already created when the arguments were
+# parsed
+_REOPEN_MODES = {'w': 'a', 'x': 'a'}
+
+
+class FileRef(object):
+    """The path and mode of a file argument, in place of the open file.
+
+    :param path: the path to the file, or '-' for stdin/stdout
+    :param mode: the mode the file was opened with, or 'mmap' for files
+    mapped by the File-mmap type
+    """
+    __slots__ = ('path', 'mode')
+
+    def __init__(self, path, mode):
+        self.path = path
+        self.mode = mode
+
+    def open(self):
+        """Opens the file again (files opened for writing are appended to)."""
+        if self.mode == 'mmap':
+            return MmapType()(self.path)
+        if self.path == '-':
+            stream = sys.stdin if 'r' in self.mode else sys.stdout
+            if 'b' in self.mode:
+                return getattr(stream, 'buffer', stream)
+            return stream
+        mode = "".join(_REOPEN_MODES.get(c, c) for c in self.mode)
+        return open(self.path, mode)
+
+    def __eq__(self, other):
+        if isinstance(other, FileRef):
+            return (self.path, self.mode) == (other.path, other.mode)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash((self.path, self.mode))
+
+    def __reduce__(self):
+        return (FileRef, (self.path, self.mode))
+
+    def __repr__(self):
+        return "FileRef({0!r}, {1!r})".format(self.path, self.mode)
+
+
+class Snapshot(object):
+    """The resolved values of parsed arguments, in a picklable form.
+
+    Values are pickled as two flat tuples (the names and the values), with
+    files replaced by FileRefs, so a snapshot costs little more to send than
+    the values themselves.
+
+    :param names: the argument names
+    :param values: the values, in the same order as `names`
+    """
+    __slots__ = ('names', 'values')
+
+    def __init__(self, names, values):
+        self.names = tuple(names)
+        self.values = tuple(values)
+
+    @classmethod
+    def take(cls, namespace):
+        """Records the arguments in a Namespace (or any object's attributes).
+
+        :param namespace: the parsed arguments
+        """
+        items = list(vars(namespace).items())
+        return cls([name for name, _ in items],
+                   [_freeze(value) for _, value in items])
+
+    def restore(self):
+        """Returns a Namespace of the arguments, with files opened again."""
+        return argparse.Namespace(**dict(
+            (name, _thaw(value))
+            for name, value in zip(self.names, self.values)))
+
+    def __eq__(self, other):
+        if isinstance(other, Snapshot):
+            return (self.names, self.values) == (other.names, other.values)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return (Snapshot, (self.names, self.values))
+
+    def __repr__(self):
+        return "Snapshot({0})".format(", ".join(
+            "{0}={1!r}".format(name, value)
+            for name, value in zip(self.names, self.values)))
+
+
+def _freeze(value):
+    """Replaces a file (or a list of files) with FileRefs."""
+    if isinstance(value, list):
+        return [_freeze(item) for item in value]
+    elif isinstance(value, LazyFile):
+        # LazyFiles pickle themselves, without opening the file
+        return value
+    elif _is_std_stream(value):
+        mode = 'rb' if _is_stdin(value) else 'wb'
+        if hasattr(value, 'encoding'):
+            mode = mode[0]
+        return FileRef('-', mode)
+    elif _types._mapped_file_cls is not None and isinstance(
+            value, _types._mapped_file_cls):
+        return FileRef(value.name, 'mmap')
+    elif hasattr(value, 'fileno') and isinstance(
+            getattr(value, 'name', None), str) and (
+                not value.name.startswith('<')):
+        return FileRef(value.name, value.mode)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, FileRef):
+        return value.open()
+    elif isinstance(value, list):
+        return [_thaw(item) for item in value]
+    return value
+
+
+def _is_stdin(value):
+    return value is sys.stdin or value is getattr(sys.stdin, 'buffer', None)
+
+
+def _is_std_stream(value):
+    for stream in (sys.stdin, sys.stdout):
+        if value is stream or value is getattr(stream, 'buffer', None):
+            return True
+    return False
@@ -0,0 +1,519 @@
+"""A compact, pre-resolved representation of argument specs.
+
+`CommandSpec.from_dict` turns an argsdict (as provided by argutils.read.*)
+into an immutable CommandSpec holding one ArgSpec per argument. Each ArgSpec
+resolves `nargs`, `type` and `choices` once, when it's created, rather than
+every time a parser is built. (stdin/stdout defaults are the exception: they're
+looked up when a parser is built, so that redirected streams are used.) The
+exporters in argutils.export accept CommandSpecs anywhere they accept an
+argsdict.
+"""
+import argparse
+import sys
+from collections import OrderedDict
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+import warnings
+
+from argutils import (
+    META_KEY, DESC_KEY, EXCLUDE_FLAG, FILE_W, FILE_R, FILE_WB, FILE_RB,
+    FILE_MMAP, LAZY_FILE_W, LAZY_FILE_R, LAZY_FILE_WB, LAZY_FILE_RB, INT_ARRAY,
+    FLOAT_ARRAY
+)
+from argutils.types import (
+    ArgfileAction, ArrayAction, ArrayType, LazyFileType, MmapType
+)
+
+_NARGS_PATTERNS = ('+', '?', '*', argparse.REMAINDER)
+
+
+class _Immutable(object):
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(
+            "{0} objects are immutable".format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError(
+            "{0} objects are immutable".format(type(self).__name__))
+
+
+# Inline choice lists longer than this are summarized in --help
+CHOICES_SUMMARY_LIMIT = 10
+
+
+class Choices(object):
+    """A container of allowed values with hashed membership tests.
+
+    Values keep their original order for display. File-backed choices are
+    only read (and coerced to the argument's type) the first time they're
+    needed, which is usually when argparse checks a value given for the
+    option.
+
+    :param values: (optional) the allowed values
+    :param path: (optional) a file listing the allowed values, one per line;
+    blank lines and lines starting with '#' are ignored
+    :param arg_type: a type to coerce values read from `path` to
+    """
+    __slots__ = ('path', '_type', '_values', '_set')
+
+    def __init__(self, values=None, path=None, arg_type=str):
+        self.path = path
+        self._type = arg_type
+        self._values = None
+        self._set = None
+        if values is not None:
+            self._values = tuple(values)
+
+    def _load(self):
+        if self._values is None:
+            with open(self.path) as infile:
+                lines = (line.strip() for line in infile)
+                self._values = tuple(
+                    self._type(line) for line in lines
+                    if line and not line.startswith('#'))
+        return self._values
+
+    @property
+    def values(self):
+        """The allowed values, in order (reading them if needed)."""
+        return self._load()
+
+    @property
+    def loaded(self):
+        return self._values is not None
+
+    def __contains__(self, value):
+        if self._set is None:
+            try:
+                self._set = frozenset(self._load())
+            except TypeError:
+                # Unhashable choices; fall back to a linear scan
+                return value in self._load()
+        try:
+            return value in self._set
+        except TypeError:
+            return False
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __eq__(self, other):
+        if isinstance(other, Choices):
+            if self.path is not None or other.path is not None:
+                return self.path == other.path and self._type == other._type
+            return self._values == other._values
+        if isinstance(other, (list, tuple)):
+            return self._load() == tuple(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __reduce__(self):
+        if self.path is not None:
+            return (Choices, (None, self.path, self._type))
+        return (Choices, (self._values,))
+
+    def __repr__(self):
+        if self.path is not None:
+            return "Choices(path={0!r})".format(self.path)
+        return "Choices({0!r})".format(self._values)
+
+    def summary(self, limit=CHOICES_SUMMARY_LIMIT):
+        """Returns a short metavar for --help, or None if all the values
+        should be listed as usual.
+
+        :param limit: the number of inline values that can be listed in full
+        """
+        if self.path is not None:
+            import os
+            return "{{values in {0}}}".format(os.path.basename(self.path))
+        if len(self._values) <= limit:
+            return None
+        shown = ",".join(str(value) for value in self._values[:3])
+        return "{{{0},... ({1} choices)}}".format(shown, len(self._values))
+
+    def describe(self, limit=CHOICES_SUMMARY_LIMIT):
+        """Returns the allowed values for an error message, listing only the
+        first few of a long list (the values are read if needed).
+
+        :param limit: the number of values that can be listed in full
+        """
+        values = self._load()
+        if len(values) <= limit:
+            return ", ".join(repr(value) for value in values)
+        shown = ", ".join(repr(value) for value in values[:3])
+        source = ""
+        if self.path is not None:
+            import os
+            source = " in {0}".format(os.path.basename(self.path))
+        return "{0}, ... ({1} choices{2})".format(shown, len(values), source)
+
+
+class ChoicesAction(argparse._StoreAction):
+    """Stores an argument's value after checking it against the argument's
+    Choices.
+
+    This takes the place of argparse's own check for choices that are
+    summarized in --help, since argparse's error message would list every
+    value. Only values given on the command line are checked, so defaults
+    never cause a choices file to be read. Errors reading a choices file are
+    reported as usage errors too.
+
+    :param choices: the allowed values, as Choices
+    """
+
+    def __init__(self, option_strings, dest, choices=None, **kwargs):
+        self.allowed = choices
+        super(ChoicesAction, self).__init__(option_strings, dest, **kwargs)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        for value in values if isinstance(values, list) else [values]:
+            try:
+                valid = value in self.allowed
+            except (IOError, OSError, ValueError) as err:
+                raise argparse.ArgumentError(
+                    self, "can't read the choices in {0}: {1}".format(
+                        self.allowed.path, err))
+            if not valid:
+                raise argparse.ArgumentError(
+                    self, "invalid choice: {0!r} (choose from {1})".format(
+                        value, self.allowed.describe()))
+        setattr(namespace, self.dest, values)
+
+
+class ArgSpec(_Immutable):
+    """A single argument from a spec, with its options resolved.
+
+    ArgSpecs also support the read-only dictionary methods used on argument
+    values (`get`, `in`, `[]`), which look up the original spec entries.
+
+    :param name: the name of the argument
+    :param argvals: the options for the argument
+    """
+    __slots__ = (
+        'name', 'flag', 'argtype', 'action', 'help', 'nargs', 'default',
+        'type', 'choices', 'metavar', 'exclude', 'argfile', '_items'
+    )
+
+    def __init__(self, name, argvals):
+        _set = object.__setattr__
+        _set(self, 'name', name)
+        # The original entries are only kept as a tuple of pairs; there are
+        # few enough that scanning it is as quick as a dict lookup
+        _set(self, '_items', tuple(argvals.items()))
+        _set(self, 'help', argvals.get(DESC_KEY, ''))
+        _set(self, 'exclude', EXCLUDE_FLAG in argvals)
+        nargs = _parse_nargs(argvals.get('nargs', None))
+        default = _parse_default(argvals.get('default'))
+
+        # What kind of values can the argument take? We generally just
+        # evaluate the type provided as a string, except for FileTypes which
+        # we handle specially
+        _type = _parse_type(
+            argvals.get('type'), name, _parse_bufsize(argvals.get('bufsize')))
+        _set(self, 'type', _type)
+
+        # Array types convert all of an option's values at once, so they're
+        # applied by ArrayAction instead of argparse (which would call the
+        # type for every value). Defaults are kept as given and converted by
+        # ArrayAction, so that generated modules don't need NumPy to hold them
+        if isinstance(_type, ArrayType):
+            if argvals.get('choices') or argvals.get('choices_file'):
+                raise ValueError(
+                    "Choices are not supported for the array type of `{}`"
+                    .format(name))
+            _set(self, 'action', ArrayAction)
+            nargs = nargs or '+'
+        else:
+            _set(self, 'action', argvals.get('action', 'store'))
+
+        # Arguments can read their values from argument files (given as the
+        # prefix followed by a path), which are only read when the values are
+        # iterated over
+        argfile = argvals.get('argfile')
+        if argfile is True:
+            argfile = '@'
+        _set(self, 'argfile', argfile or None)
+        if argfile:
+            if self.action != 'store' or argvals.get('choices') or (
+                    argvals.get('choices_file')):
+                raise ValueError(
+                    "Argument files can't be used with the action or choices "
+                    "of `{}`".format(name))
+            _set(self, 'action', ArgfileAction)
+            nargs = nargs or '+'
+        _set(self, 'nargs', nargs)
+        _set(self, 'default', default)
+
+        # Choices should be a container. We'll just split on commas and
+        # coerce to the same type as defined above. Long lists can instead be
+        # kept in a file, which is only read if the option is used.
+        choices = _parse_choices(argvals.get('choices'), _type)
+        if choices:
+            choices = Choices(choices)
+        elif argvals.get('choices_file'):
+            choices = Choices(path=argvals['choices_file'], arg_type=_type)
+        _set(self, 'choices', choices)
+        _set(self, 'metavar',
+             choices.summary() if choices is not None else None)
+
+        # There are three types of options allowed:
+        # 'arg': positional arguments, which are required,
+        # 'opt': options, which are optional, and
+        # 'flag': flags, which do not take values after them
+        argtype = argvals.get('argtype', 'opt')
+        _set(self, 'argtype', argtype)
+        prefix = '' if argtype == 'arg' else argvals.get('prefix', '--')
+        _set(self, 'flag', prefix + name)
+
+    def get(self, key, default=None):
+        for item_key, value in self._items:
+            if item_key == key:
+                return value
+        return default
+
+    def __getitem__(self, key):
+        for item_key, value in self._items:
+            if item_key == key:
+                return value
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return any(item_key == key for item_key, _ in self._items)
+
+    def keys(self):
+        return [key for key, _ in self._items]
+
+    def items(self):
+        return list(self._items)
+
+    def to_dict(self):
+        """Returns the argument's options as an OrderedDict."""
+        return OrderedDict(self._items)
+
+    def __eq__(self, other):
+        if isinstance(other, ArgSpec):
+            return self.name == other.name and self._items == other._items
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash((self.name, self._items))
+
+    def __reduce__(self):
+        return (ArgSpec, (self.name, OrderedDict(self._items)))
+
+    def __repr__(self):
+        return "ArgSpec({0!r}, {1!r})".format(self.name, dict(self._items))
+
+
+class CommandSpec(_Immutable):
+    """All the arguments of a command, in order.
+
+    CommandSpecs behave like a read-only argsdict: iterating over `items()`
+    gives the `_meta` section (if there is one) followed by each argument's
+    name and ArgSpec.
+
+    :param args: a sequence of ArgSpecs
+    :param meta: (optional) the command's `_meta` section
+    """
+    __slots__ = ('args', 'meta', '_names')
+
+    def __init__(self, args, meta=None):
+        _set = object.__setattr__
+        args = tuple(args)
+        _set(self, 'args', args)
+        _set(self, 'meta', OrderedDict(meta) if meta is not None else None)
+        _set(self, '_names', dict((arg.name, i) for i, arg in enumerate(args)))
+
+    @classmethod
+    def from_dict(cls, argsdict):
+        """Builds a CommandSpec from an argsdict.
+
+        :param argsdict: a dictionary of arguments, as provided by
+        argutils.read.*
+        """
+        if isinstance(argsdict, CommandSpec):
+            return argsdict
+        args = [ArgSpec(argname, argvals)
+                for argname, argvals in argsdict.items()
+                if argname != META_KEY]
+        return cls(args, argsdict.get(META_KEY))
+
+    def to_dict(self):
+        """Returns the spec as an argsdict (an OrderedDict)."""
+        return OrderedDict(
+            (name, value.to_dict() if isinstance(value, ArgSpec) else value)
+            for name, value in self.items())
+
+    @property
+    def description(self):
+        return self.meta.get(DESC_KEY) if self.meta else None
+
+    def items(self):
+        items = [(arg.name, arg) for arg in self.args]
+        if self.meta is not None:
+            items.insert(0, (META_KEY, self.meta))
+        return items
+
+    def keys(self):
+        return [name for name, _ in self.items()]
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __getitem__(self, key):
+        if key == META_KEY and self.meta is not None:
+            return self.meta
+        return self.args[self._names[key]]
+
+    def __contains__(self, key):
+        if key == META_KEY:
+            return self.meta is not None
+        return key in self._names
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.args) + (self.meta is not None)
+
+    def __eq__(self, other):
+        if isinstance(other, CommandSpec):
+            return self.args == other.args and self.meta == other.meta
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __reduce__(self):
+        return (CommandSpec, (self.args, self.meta))
+
+    def __repr__(self):
+        return "CommandSpec({0!r})".format([arg.name for arg in self.args])
+
+
+def _parse_nargs(nargs):
+    """Parses `nargs` from an int or string; unrecognized values are None."""
+    try:
+        return int(nargs) if nargs else nargs
+    except ValueError:
+        return nargs if nargs in _NARGS_PATTERNS else None
+
+
+def _parse_default(default):
+    """Parses a default value; unset (or false) values are None.
+
+    We only use a non-False default value for stdin/stdout options; all other
+    options pull the default values from the config file. 'stdin' and
+    'stdout' are kept as they are, and replaced by `_resolve_default`.
+    """
+    return default if default else None
+
+
+def _resolve_default(default, _type):
+    """Returns the default to build an argument with, replacing 'stdin' and
+    'stdout' with the current streams (or their buffers, for binary types).
+
+    :param default: an ArgSpec's default
+    :param _type: the ArgSpec's type
+    """
+    if not isinstance(default, str) or default not in ('stdin', 'stdout'):
+        return default
+    stream = sys.stdin if default == 'stdin' else sys.stdout
+    if _is_binary(_type):
+        return getattr(stream, 'buffer', stream)
+    return stream
+
+
+def _parse_bufsize(bufsize):
+    """Parses a file buffer size; unset values use the default (-1)."""
+    try:
+        return int(bufsize) if bufsize is not None else -1
+    except ValueError:
+        raise ValueError("Invalid buffer size: {}".format(bufsize))
+
+
+def _is_binary(_type):
+    """Whether a file type reads or writes bytes."""
+    if isinstance(_type, MmapType):
+        return True
+    elif isinstance(_type, argparse.FileType):
+        return 'b' in _type._mode
+    elif isinstance(_type, LazyFileType):
+        return 'b' in _type.mode
+    return False
+
+
+def _parse_type(typestr, argname, bufsize=-1):
+    """Parses the type from a string.
+
+    :param typestr: a string coercible to a type or argparse.FileType. If None
+    or an empty string, the default is `str`.
+    :param argname: the argument name (used for error reporting)
+    :param bufsize: the buffer size for file types (default: the system
+    default)
+    :returns: the actual type found (i.e. `int`, `str`, argparse.FileType('w'),
+    ArrayType('int'))
+    """
+    if typestr in (FILE_R, FILE_W, FILE_RB, FILE_WB):
+        return argparse.FileType(typestr.split('-')[1], bufsize)
+    elif typestr in (LAZY_FILE_R, LAZY_FILE_W, LAZY_FILE_RB, LAZY_FILE_WB):
+        return LazyFileType(typestr.split('-')[1], bufsize)
+    elif typestr == FILE_MMAP:
+        return MmapType()
+    elif typestr == INT_ARRAY:
+        return ArrayType('int')
+    elif typestr == FLOAT_ARRAY:
+        return ArrayType('float')
+    elif typestr:
+        try:
+            return getattr(builtins, typestr)
+        except AttributeError:
+            raise ValueError(
+                "Invalid type specified for `{}`: {}"
+                .format(argname, typestr)
+            )
+    else:
+        return str
+
+def _parse_choices(choices_str, arg_type):
+    """Parses the choices for an argument from a comma-separated string.
+
+    :param choices_str: a comma-separated list of options
+    :param arg_type: a type to coerce each choice to; will throw an exception
+    if the coercion fails.
+    :returns: a list of choices of the specified type
+    """
+
+    if not choices_str:
+        return None
+    else:
+        choices = [c.strip() for c in choices_str.split(",")]
+        try:
+            choices = [arg_type(c) for c in choices]
+            return choices
+        except (ValueError, argparse.ArgumentTypeError) as err:
+            warnings.warn("Could not coerce choice(s) to given type!")
+            raise err
@@ -0,0 +1,403 @@
+"""Argument types and actions beyond the builtin types and FileType."""
+import argparse
+import array
+import io
+import os
+import sys
+
+# array.array's 'q' (long long) type code isn't available on Python 2
+_INT_CODE = 'q' if 'q' in array.typecodes else 'l'
+
+
+class ArrayType(object):
+    """Converts a list of strings to a typed array in a single step.
+
+    Values are converted to a NumPy array if NumPy is installed, or to an
+    `array.array` otherwise. A single string (i.e. a default read from a
+    config file) is split on commas and whitespace first.
+
+    :param kind: 'int' or 'float'
+    :param use_numpy: (optional) True or False to require or avoid NumPy; by
+    default it is used if it's installed
+    """
+
+    def __init__(self, kind, use_numpy=None):
+        if kind not in ('int', 'float'):
+            raise ValueError("Unsupported array type: {0}".format(kind))
+        self.kind = kind
+        self.use_numpy = use_numpy
+
+    def __call__(self, values):
+        if isinstance(values, str):
+            values = values.replace(',', ' ').split()
+        numpy = self._numpy()
+        try:
+            if numpy is not None:
+                dtype = numpy.int64 if self.kind == 'int' else numpy.float64
+                return numpy.array(values, dtype=dtype)
+            elif self.kind == 'int':
+                return array.array(_INT_CODE, map(int, values))
+            else:
+                return array.array('d', map(float, values))
+        except (TypeError, ValueError, OverflowError):
+            raise argparse.ArgumentTypeError(
+                "invalid {0} value: {1!r}".format(
+                    self.kind, self._find_bad_value(values)))
+
+    def _numpy(self):
+        if self.use_numpy is False:
+            return None
+        try:
+            import numpy
+        except ImportError:
+            if self.use_numpy:
+                raise
+            return None
+        return numpy
+
+    def _find_bad_value(self, values):
+        convert = int if self.kind == 'int' else float
+        for value in values:
+            try:
+                convert(value)
+            except (TypeError, ValueError, OverflowError):
+                return value
+        # NumPy rejected something Python accepts (i.e. an int too large
+        # for int64), so we can't single out a token more precisely
+        return values
+
+    def __eq__(self, other):
+        if isinstance(other, ArrayType):
+            return (self.kind, self.use_numpy) == (other.kind, other.use_numpy)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash((self.kind, self.use_numpy))
+
+    def __repr__(self):
+        if self.use_numpy is None:
+            return "ArrayType({0!r})".format(self.kind)
+        return "ArrayType({0!r}, use_numpy={1!r})".format(
+            self.kind, self.use_numpy)
+
+
+class ArrayAction(argparse.Action):
+    """Stores all of an option's values, converted together by an ArrayType.
+
+    argparse would otherwise call the type once per value; this takes the
+    ArrayType as `type` and applies it to the whole list instead. String
+    and list defaults (from the spec, or from `set_parser_defaults`) are
+    converted when they're set, since argparse won't convert them without a
+    `type`.
+    """
+
+    def __init__(self, option_strings, dest, type=None, **kwargs):
+        self.converter = type
+        super(ArrayAction, self).__init__(option_strings, dest, **kwargs)
+
+    @property
+    def default(self):
+        return self._default
+
+    @default.setter
+    def default(self, value):
+        # Strings (and lists, i.e. from a YAML spec) are raw defaults
+        if self.converter is not None and isinstance(
+                value, (str, list, tuple)):
+            value = self.converter(value)
+        self._default = value
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        if not isinstance(values, list):
+            values = [values]
+        try:
+            values = self.converter(values)
+        except argparse.ArgumentTypeError as err:
+            raise argparse.ArgumentError(self, str(err))
+        setattr(namespace, self.dest, values)
+
+
+class ArgfileValues(object):
+    """The values of an argument, with argument files read as they're used.
+
+    Iterating yields each value given on the command line, except that a
+    value starting with `prefix` is replaced by the lines of the named file
+    (which is read with gzip if its name ends in '.gz'). Blank lines and
+    lines starting with '#' are skipped. Files are read one line at a time,
+    and are read again each time the values are iterated over.
+
+    Values given directly are converted (and checked) when the ArgfileValues
+    is created; only the values in argument files are converted as they're
+    read, so a bad value in a file raises ValueError while iterating.
+
+    :param values: the values given on the command line
+    :param prefix: the prefix marking an argument file
+    :param converter: (optional) a function to convert each value with
+    """
+
+    def __init__(self, values, prefix='@', converter=None):
+        self.values = tuple(values)
+        self.prefix = prefix
+        self.converter = converter
+        # None in place of each argument file
+        self._converted = tuple(
+            None if self._is_argfile(value) else self._convert(value)
+            for value in self.values)
+
+    def _is_argfile(self, value):
+        return value.startswith(self.prefix)
+
+    def __iter__(self):
+        for value, converted in zip(self.values, self._converted):
+            if self._is_argfile(value):
+                for item in self._read(value[len(self.prefix):]):
+                    yield item
+            else:
+                yield converted
+
+    def _convert(self, value, source=None):
+        if self.converter is None:
+            return value
+        try:
+            return self.converter(value)
+        except (TypeError, ValueError, argparse.ArgumentTypeError):
+            if source is None:
+                # The same message argparse gives for a bad value
+                raise ValueError("invalid {0} value: {1!r}".format(
+                    getattr(self.converter, '__name__',
+                            repr(self.converter)), value))
+            raise ValueError(
+                "invalid value on {0}: {1!r}".format(source, value))
+
+    def _read(self, path):
+        if path.endswith('.gz'):
+            import gzip
+            # (gzip.open has no text mode on Python 2)
+            infile = io.TextIOWrapper(gzip.open(path, 'rb'))
+        else:
+            infile = io.open(path)
+        with infile:
+            for lineno, line in enumerate(infile, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                yield self._convert(
+                    line, "line {0} of {1}".format(lineno, path))
+
+    def __eq__(self, other):
+        if isinstance(other, ArgfileValues):
+            return (self.values, self.prefix) == (other.values, other.prefix)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "ArgfileValues({0!r})".format(list(self.values))
+
+
+class ArgfileAction(argparse.Action):
+    """Stores an argument's values as ArgfileValues, so values listed in
+    argument files are read lazily instead of being loaded into a list.
+
+    Values given on the command line are checked while parsing, as usual;
+    values in argument files are converted to the argument's type as they're
+    iterated over, so a bad value there raises ValueError then. String
+    defaults (i.e. from `set_parser_defaults`) are split on whitespace and
+    stored as ArgfileValues too.
+
+    :param argfile_prefix: the prefix marking an argument file
+    """
+
+    def __init__(self, option_strings, dest, type=None, argfile_prefix='@',
+                 **kwargs):
+        self.converter = None if type is str else type
+        self.argfile_prefix = argfile_prefix
+        super(ArgfileAction, self).__init__(option_strings, dest, **kwargs)
+
+    @property
+    def default(self):
+        return self._default
+
+    @default.setter
+    def default(self, value):
+        if isinstance(value, str):
+            value = ArgfileValues(
+                value.split(), self.argfile_prefix, self.converter)
+        self._default = value
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        if not isinstance(values, list):
+            values = [values]
+        try:
+            values = ArgfileValues(values, self.argfile_prefix, self.converter)
+        except ValueError as err:
+            raise argparse.ArgumentError(self, str(err))
+        setattr(namespace, self.dest, values)
+
+
+def _std_stream(mode):
+    """Returns stdin or stdout for '-', as argparse.FileType does."""
+    stream = sys.stdin if 'r' in mode else sys.stdout
+    if 'b' in mode:
+        return getattr(stream, 'buffer', stream)
+    return stream
+
+
+class LazyFile(object):
+    """A file that isn't opened until it's first used.
+
+    Reading, writing, iterating or entering it in a `with` statement opens the
+    file; a file that's never used is never opened (or created).
+
+    :param name: the path to the file, or '-' for stdin/stdout
+    :param mode: the mode to open the file with
+    :param bufsize: the buffer size to open the file with
+    """
+
+    def __init__(self, name, mode='r', bufsize=-1):
+        self.name = name
+        self.mode = mode
+        self.bufsize = bufsize
+        self._file = None
+
+    def open(self):
+        """Opens the file if it isn't open yet, and returns the file object."""
+        if self._file is None:
+            if self.name == '-':
+                self._file = _std_stream(self.mode)
+            else:
+                self._file = open(self.name, self.mode, self.bufsize)
+        return self._file
+
+    @property
+    def opened(self):
+        return self._file is not None
+
+    @property
+    def closed(self):
+        return self._file is not None and self._file.closed
+
+    def close(self):
+        if self._file is not None and self.name != '-':
+            self._file.close()
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return getattr(self.open(), attr)
+
+    def __iter__(self):
+        return iter(self.open())
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __reduce__(self):
+        # Unpickled copies open the file again themselves
+        return (LazyFile, (self.name, self.mode, self.bufsize))
+
+    def __repr__(self):
+        return "LazyFile({0!r}, {1!r})".format(self.name, self.mode)
+
+
+class LazyFileType(object):
+    """Like argparse.FileType, but returns LazyFiles, which are only opened
+    when they're used.
+
+    :param mode: the mode to open files with
+    :param bufsize: the buffer size to open files with
+    """
+
+    def __init__(self, mode='r', bufsize=-1):
+        self.mode = mode
+        self.bufsize = bufsize
+
+    def __call__(self, string):
+        return LazyFile(string, self.mode, self.bufsize)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyFileType):
+            return (self.mode, self.bufsize) == (other.mode, other.bufsize)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash((self.mode, self.bufsize))
+
+    def __repr__(self):
+        if self.bufsize == -1:
+            return "LazyFileType({0!r})".format(self.mode)
+        return "LazyFileType({0!r}, {1!r})".format(self.mode, self.bufsize)
+
+
+# The mmap subclass returned by MmapType, built by _mapped_file_class
+_mapped_file_cls = None
+
+
+def _mapped_file_class():
+    """Builds the mmap subclass once, so mmap is only imported if needed."""
+    global _mapped_file_cls
+    if _mapped_file_cls is None:
+        import mmap
+
+        class MappedFile(mmap.mmap):
+            """A read-only memory map of a file, with the file's `name`."""
+            name = None
+
+        _mapped_file_cls = MappedFile
+    return _mapped_file_cls
+
+
+class MmapType(object):
+    """Maps an input file into memory read-only.
+
+    The returned object supports slicing, `find` and `memoryview` without
+    copying the file. Files that can't be mapped (empty files, and stdin
+    given as '-') are read into a bytes object instead.
+    """
+
+    def __call__(self, string):
+        if string == '-':
+            return _std_stream('rb').read()
+        try:
+            with open(string, 'rb') as infile:
+                if not os.fstat(infile.fileno()).st_size:
+                    return b''
+                import mmap
+                mapped = _mapped_file_class()(
+                    infile.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError) as err:
+            raise argparse.ArgumentTypeError(
+                "can't open '{0}': {1}".format(string, err))
+        mapped.name = string
+        return mapped
+
+    def __eq__(self, other):
+        if isinstance(other, MmapType):
+            return True
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash(MmapType)
+
+    def __repr__(self):
+        return "MmapType()"
@@ -15,7 +15,7 @@ def main():
     config = ConfigParser.SafeConfigParser()
 
     # Read the spec and build a parser from it
-    argsdict = read.from_yaml(open(SPEC_FILE).read())
+    argsdict = read.from_path(SPEC_FILE)
     parser = export.to_argparser(prog_name, argsdict)
 
     # If the config file exists and we can read it, use it to set the 
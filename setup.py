@@ -13,9 +13,11 @@ setup(
     description='Functions to build matched argument parsers and config files',
     long_description=open('README.rst').read(),
     install_requires=[
-    	'six',
     	'pyyaml'
     ],
+    entry_points={
+        'console_scripts': ['argutils = argutils.cli:main'],
+    },
     classifiers=[
         'License :: OSI Approved :: GNU General Public License v2 or later (GPLv2+)',
         'Operating System :: POSIX :: Linux',
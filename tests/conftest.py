@@ -69,4 +69,16 @@ flag =
 choices = 1
 """
 
-    return cfg_str
\ No newline at end of file
+    return cfg_str
+
+@pytest.fixture
+def commands(argsdict):
+    d = OrderedDict()
+    d[META_KEY] = {DESC_KEY: "Program description"}
+    d['run'] = argsdict
+    d['clean'] = OrderedDict([
+        (META_KEY, {DESC_KEY: "Remove outputs"}),
+        ('force', OrderedDict([('argtype', 'flag')])),
+        ('keep', OrderedDict([('default', 2), ('type', 'int')])),
+    ])
+    return d
@@ -0,0 +1,63 @@
+"""Test batch validation of command lines."""
+import shlex
+from collections import OrderedDict
+import pytest
+from argutils import batch
+try:
+    import ConfigParser
+except ImportError:
+    import configparser as ConfigParser
+
+@pytest.fixture
+def simple_argsdict():
+    return OrderedDict([
+        ('count', {'type': 'int', 'default': 2}),
+        ('mode', {'choices': 'fast, slow'}),
+        ('input', {'argtype': 'arg'}),
+    ])
+
+ARGV_LIST = [
+    shlex.split("in.txt"),
+    shlex.split("--count 5 in.txt"),
+    shlex.split("--count five in.txt"),
+    shlex.split("--mode medium in.txt"),
+    shlex.split("--help"),
+    [],
+]
+
+def _check(results):
+    assert [r.ok for r in results] == [True, True, False, False, False, False]
+    assert results[0].namespace.count == 2
+    assert results[1].namespace.count == 5
+    assert "invalid int value" in results[2].error
+    assert "invalid choice" in results[3].error
+    assert results[4].error.startswith("usage: test")
+    assert "required" in results[5].error
+    assert [r.argv for r in results] == ARGV_LIST
+
+def test_parse_many(simple_argsdict, capsys):
+    _check(batch.parse_many('test', simple_argsdict, ARGV_LIST))
+    # Nothing should be printed for errors or --help
+    out, err = capsys.readouterr()
+    assert out == err == ""
+
+def test_parse_many_threads(simple_argsdict):
+    _check(batch.parse_many(
+        'test', simple_argsdict, ARGV_LIST, pool='thread', workers=3))
+
+def test_parse_many_processes(simple_argsdict):
+    _check(batch.parse_many(
+        'test', simple_argsdict, ARGV_LIST, pool='process', workers=2,
+        restore=True))
+
+def test_parse_many_config(simple_argsdict):
+    config = ConfigParser.ConfigParser()
+    config.add_section('test')
+    config.set('test', 'count', '7')
+    results = batch.parse_many(
+        'test', simple_argsdict, [["in.txt"]], config=config)
+    assert results[0].namespace.count == 7
+
+def test_parse_many_bad_pool(simple_argsdict):
+    with pytest.raises(ValueError):
+        batch.parse_many('test', simple_argsdict, [], pool='gpu')
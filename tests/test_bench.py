@@ -0,0 +1,20 @@
+"""Smoke tests for the benchmark suite."""
+from argutils import bench, read, export
+
+def test_make_spec():
+    """Generated specs should round-trip through both readers."""
+    spec = bench.make_spec(12)
+    assert len(spec) == 13
+    assert read.from_json(bench.to_json(spec)) == spec
+    assert read.from_yaml(bench.to_yaml(spec)) == spec
+    export.to_argparser('bench', spec)
+
+def test_run_and_compare(tmpdir):
+    results = bench.run(sizes=(10,), repeat=1)
+    assert len(results) == 8
+    assert all(r['seconds'] >= 0 for r in results)
+    out = str(tmpdir.join("results.json"))
+    bench.save(results, out)
+    rows = bench.compare(bench.load(out), results)
+    assert len(rows) == len(results)
+    assert all(ratio == 1.0 for _, _, _, _, ratio in rows if ratio)
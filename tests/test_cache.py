@@ -0,0 +1,67 @@
+"""Test the in-memory parser cache."""
+import threading
+from collections import OrderedDict
+from argutils import cache
+try:
+    import ConfigParser
+except ImportError:
+    import configparser as ConfigParser
+
+def _config(**values):
+    config = ConfigParser.ConfigParser()
+    config.add_section('test')
+    for key, value in values.items():
+        config.set('test', key, value)
+    return config
+
+def test_parser_cache_hits(argsdict):
+    parsers = cache.ParserCache()
+    first = parsers.get('test', argsdict)
+    assert parsers.get('test', argsdict) is first
+    assert parsers.get('other', argsdict) is not first
+    assert parsers.stats() == {
+        'hits': 1, 'misses': 2, 'evictions': 0, 'size': 2, 'maxsize': 128}
+
+def test_parser_cache_config_isolation(argsdict):
+    """Different configs should never share parser defaults."""
+    parsers = cache.ParserCache()
+    args = parsers.parse_args(
+        'test', argsdict, ['/dev/null'], config=_config(arg2='3'))
+    assert args.arg2 == 3
+    args = parsers.parse_args(
+        'test', argsdict, ['/dev/null'], config=_config(arg2='4'))
+    assert args.arg2 == 4
+    args = parsers.parse_args('test', argsdict, ['/dev/null'])
+    assert args.arg2 == 1
+    # Same contents, different ConfigParser object
+    args = parsers.parse_args(
+        'test', argsdict, ['/dev/null'], config=_config(arg2='3'))
+    assert args.arg2 == 3
+    assert parsers.hits == 1
+
+def test_parser_cache_eviction():
+    parsers = cache.ParserCache(maxsize=2)
+    specs = [OrderedDict([('arg{0}'.format(i), {'default': i})])
+             for i in range(3)]
+    for spec in specs:
+        parsers.get('test', spec)
+    assert len(parsers) == 2
+    assert parsers.evictions == 1
+    # The oldest spec was evicted
+    parsers.get('test', specs[0])
+    assert parsers.misses == 4
+
+def test_parser_cache_threads(argsdict):
+    parsers = cache.ParserCache()
+    results = []
+    def worker(i):
+        args = parsers.parse_args(
+            'test', argsdict, ['--arg2', str(i), '/dev/null'])
+        results.append(args.arg2 == i)
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 20 and all(results)
+    assert parsers.hits + parsers.misses == 20
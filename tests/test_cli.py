@@ -0,0 +1,45 @@
+"""Test the `argutils` command."""
+import json
+import os
+import pytest
+from argutils import cli, read
+
+def test_compile_module(yaml_file, tmpdir):
+    out = str(tmpdir.join('test_args.py'))
+    assert cli.main(['compile', yaml_file, '-o', out]) == 0
+    namespace = {}
+    with open(out) as module_file:
+        exec(compile(module_file.read(), out, 'exec'), namespace)
+    parser = namespace['build_parser']()
+    assert parser.prog == 'test'
+    assert parser.parse_args(['/dev/null']).arg2 == 1
+
+def test_compile_cache(yaml_file, argsdict, tmpdir):
+    cache_dir = str(tmpdir.join('cache'))
+    assert cli.main(
+        ['compile', yaml_file, '--format', 'cache', '--cache-dir', cache_dir]
+    ) == 0
+    assert len(os.listdir(cache_dir)) == 1
+    assert read.from_path(
+        yaml_file, use_cache=True, cache_dir=cache_dir) == argsdict
+
+def test_compile_invalid(tmpdir, capsys):
+    spec = tmpdir.join('bad.yaml')
+    spec.write("arg:\n  type: nonsense\n")
+    with pytest.raises(SystemExit) as err:
+        cli.main(['compile', str(spec)])
+    assert err.value.code == 1
+    assert "Invalid type specified for `arg`" in capsys.readouterr().err
+
+def test_config_and_completion(yaml_file, argsdict_cfg_str, capsys):
+    assert cli.main(['config', yaml_file, '--name', 'Section']) == 0
+    assert capsys.readouterr().out == argsdict_cfg_str
+    assert cli.main(['completion', yaml_file, '--shell', 'zsh']) == 0
+    assert capsys.readouterr().out.startswith('#compdef test')
+
+def test_bench(yaml_file, tmpdir, capsys):
+    out = str(tmpdir.join('results.json'))
+    assert cli.main(['bench', yaml_file, '--repeat', '1', '-o', out]) == 0
+    assert 'export.to_argparser' in capsys.readouterr().out
+    with open(out) as results:
+        assert len(json.load(results)['results']) == 6
@@ -0,0 +1,86 @@
+"""Test specs composed from shared files."""
+import os
+import pytest
+from argutils import compose, export, read
+
+COMMON = """\
+threads:
+  type: int
+  default: 1
+  help: Number of threads
+logging:
+  verbose:
+    argtype: flag
+  log:
+    $ref: '#threads'
+    type: str
+"""
+
+SPEC = """\
+input:
+  argtype: arg
+threads:
+  $ref: common.yaml#threads
+  default: 4
+$include: common.yaml#logging
+"""
+
+@pytest.fixture
+def spec_dir(tmpdir):
+    compose.clear()
+    tmpdir.join('common.yaml').write(COMMON)
+    tmpdir.join('a.yaml').write(SPEC)
+    tmpdir.join('b.json').write(
+        '{"$include": ["common.yaml#logging"], "other": {"default": 1}}')
+    return tmpdir
+
+def test_composed(spec_dir):
+    spec = read.composed(str(spec_dir.join('a.yaml')))
+    assert list(spec) == ['input', 'threads', 'verbose', 'log']
+    assert spec['threads'] == {
+        'type': 'int', 'default': 4, 'help': 'Number of threads'}
+    assert spec['log']['type'] == 'str'
+    assert spec['log']['help'] == 'Number of threads'
+    args = export.to_argparser('a', spec).parse_args(['in.txt', '--verbose'])
+    assert args.threads == 4 and args.verbose
+
+def test_shared_files_parsed_once(spec_dir, monkeypatch):
+    parsed = []
+    from_path = read.from_path
+    monkeypatch.setattr(read, 'from_path', lambda path, *args: (
+        parsed.append(os.path.basename(path)) or from_path(path, *args)))
+    a = read.composed(str(spec_dir.join('a.yaml')))
+    b = read.composed(str(spec_dir.join('b.json')))
+    assert sorted(parsed) == ['a.yaml', 'b.json', 'common.yaml']
+    # Both specs hold the same shared objects
+    assert a['verbose'] is b['verbose']
+    # Changing the shared file means it's read again
+    spec_dir.join('common.yaml').write(
+        COMMON.replace('flag', 'opt') + "# changed\n")
+    assert read.composed(str(spec_dir.join('b.json')))['verbose'] == {
+        'argtype': 'opt'}
+    assert parsed.count('common.yaml') == 2
+
+def test_circular_references(spec_dir):
+    spec_dir.join('loop1.yaml').write("x:\n  $ref: loop2.yaml#x\n")
+    spec_dir.join('loop2.yaml').write("x:\n  $include: loop1.yaml\n")
+    with pytest.raises(ValueError) as err:
+        read.composed(str(spec_dir.join('loop1.yaml')))
+    assert "Circular reference" in str(err.value)
+    spec_dir.join('self.yaml').write(
+        "a:\n  $ref: '#b'\nb:\n  $ref: '#a'\n")
+    with pytest.raises(ValueError):
+        read.composed(str(spec_dir.join('self.yaml')))
+    spec_dir.join('missing.yaml').write("a:\n  $ref: 'common.yaml#nope'\n")
+    with pytest.raises(ValueError) as err:
+        read.composed(str(spec_dir.join('missing.yaml')))
+    assert "common.yaml#nope not found" in str(err.value)
+
+def test_files_referring_to_each_other(spec_dir):
+    """Files can refer to different parts of each other."""
+    spec_dir.join('x.yaml').write(
+        "x:\n  $ref: y.yaml#x\ny:\n  default: 1\n")
+    spec_dir.join('y.yaml').write(
+        "x:\n  $ref: x.yaml#y\n  type: int\n")
+    spec = read.composed(str(spec_dir.join('x.yaml')))
+    assert spec['x'] == {'default': 1, 'type': 'int'}
@@ -0,0 +1,90 @@
+"""Test defaults merged from a stack of config files."""
+import copy
+import sys
+from collections import OrderedDict
+import pytest
+from argutils import cache, config, export
+
+@pytest.fixture
+def layered_argsdict():
+    return OrderedDict([
+        ('threads', OrderedDict([('type', 'int'), ('default', 1)])),
+        ('ratio', OrderedDict([('type', 'float')])),
+        ('name', OrderedDict([('default', 'x')])),
+        ('sizes', OrderedDict([('type', 'int'), ('nargs', '+')])),
+        ('coords', OrderedDict([('type', 'int-array')])),
+        ('verbose', OrderedDict([('argtype', 'flag')])),
+        ('output', OrderedDict([('type', 'File-w')])),
+    ])
+
+@pytest.fixture
+def config_stack(tmpdir):
+    system = tmpdir.join('system.cfg')
+    system.write("[prog]\nthreads = 2\nratio = 0.5\nname = system\n"
+                 "verbose = yes\noutput = stdout\n")
+    user = tmpdir.join('user.cfg')
+    user.write("[prog]\nthreads = 8\nsizes = 1 2 3\ncoords = 4, 5\n"
+               "verbose =\n[other]\nthreads = 3\n")
+    missing = tmpdir.join('missing.cfg')
+    return [str(system), str(missing), str(user)]
+
+def test_merged_defaults(layered_argsdict, config_stack, tmpdir):
+    defaults = config.merged_defaults(
+        config_stack, layered_argsdict, 'prog', str(tmpdir.join('cache')))
+    assert defaults['threads'] == 8
+    assert defaults['ratio'] == 0.5
+    assert defaults['name'] == 'system'
+    assert defaults['sizes'] == [1, 2, 3]
+    assert list(defaults['coords']) == [4, 5]
+    assert defaults['verbose'] is False
+    assert defaults['output'] is sys.stdout
+
+def test_set_layered_defaults(layered_argsdict, config_stack, tmpdir):
+    parser = export.to_argparser('prog', layered_argsdict)
+    config.set_layered_defaults(
+        parser, layered_argsdict, config_stack, cache_dir=str(tmpdir))
+    args = parser.parse_args([])
+    assert args.threads == 8 and args.sizes == [1, 2, 3]
+    with pytest.warns(UserWarning):
+        config.set_layered_defaults(
+            parser, layered_argsdict, config_stack, section='absent',
+            cache_dir=str(tmpdir))
+
+def test_cached_until_changed(layered_argsdict, config_stack, tmpdir,
+                              monkeypatch):
+    cache_dir = str(tmpdir.join('cache'))
+    merges = []
+    merge = config._merge
+    monkeypatch.setattr(config, '_merge', lambda *args: (
+        merges.append(args) or merge(*args)))
+    for _ in range(3):
+        config.merged_defaults(config_stack, layered_argsdict, 'prog',
+                               cache_dir)
+    assert len(merges) == 1
+    # Creating a missing file, or changing a file, invalidates the entry
+    with open(config_stack[1], 'w') as new_file:
+        new_file.write("[prog]\nthreads = 16\nname = site\n")
+    defaults = config.merged_defaults(
+        config_stack, layered_argsdict, 'prog', cache_dir)
+    assert len(merges) == 2
+    assert defaults['threads'] == 8 and defaults['name'] == 'site'
+    # ... as does changing the spec (specs are hashed once per object, so a
+    # changed spec is a new object, as when it's read again)
+    digests = []
+    spec_digest = cache.spec_digest
+    monkeypatch.setattr(cache, 'spec_digest', lambda *parts: (
+        digests.append(parts) or spec_digest(*parts)))
+    config.merged_defaults(config_stack, layered_argsdict, 'prog', cache_dir)
+    assert len(merges) == 2 and digests == []
+    changed = copy.deepcopy(layered_argsdict)
+    changed['name']['type'] = 'str'
+    config.merged_defaults(config_stack, changed, 'prog', cache_dir)
+    assert len(merges) == 3 and len(digests) == 1
+
+def test_invalid_value(layered_argsdict, tmpdir):
+    bad = tmpdir.join('bad.cfg')
+    bad.write("[prog]\nthreads = many\n")
+    with pytest.raises(ValueError) as err:
+        config.merged_defaults([str(bad)], layered_argsdict, 'prog',
+                               use_cache=False)
+    assert "`threads` in section [prog]: 'many'" in str(err.value)
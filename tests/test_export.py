@@ -1,5 +1,7 @@
 """Test export functions."""
+import io
 import shlex
+import subprocess
 import sys
 from collections import OrderedDict
 import pytest
@@ -143,3 +145,158 @@ def test_to_config_file(argsdict, tmpdir, argsdict_cfg_str):
         cfg_str = export.to_config_file("Section", argsdict, str(cfg_out))
     assert cfg_out.read() == argsdict_cfg_str
 
+
+def _load_generated(source):
+    namespace = {}
+    exec(compile(source, "<generated>", "exec"), namespace)
+    return namespace['build_parser']()
+
+def test_to_python_module(argsdict):
+    """The generated parser should behave like the one from to_argparser."""
+    source = export.to_python_module('Command', argsdict)
+    assert 'yaml' not in source
+    assert 'argutils' not in source.split('"""')[-1]
+    generated = _load_generated(source)
+    parser = export.to_argparser('Command', argsdict)
+    assert generated.format_help() == parser.format_help()
+    for argv in ["--arg1 someval --arg2 5 --flag --choices 2 /dev/null", "/dev/null"]:
+        expected = vars(parser.parse_args(shlex.split(argv)))
+        result = vars(generated.parse_args(shlex.split(argv)))
+        assert expected.pop('output').name == result.pop('output').name
+        assert result == expected
+    with pytest.raises(SystemExit):
+        generated.parse_args(shlex.split("--choices 4 blah"))
+
+def test_to_python_module_types():
+    """FileTypes, stdin defaults and nargs should survive code generation."""
+    argsdict = OrderedDict([
+        ('infile', {'type': FILE_R, 'default': 'stdin'}),
+        ('outfile', {'type': FILE_W}),
+        ('nums', {'type': 'float', 'nargs': '+'}),
+    ])
+    generated = _load_generated(export.to_python_module('test', argsdict))
+    args = generated.parse_args(
+        shlex.split("--outfile /dev/null --nums 1 2.5"))
+    assert args.infile == sys.stdin
+    assert args.outfile.mode == 'w'
+    assert args.nums == [1.0, 2.5]
+
+def test_iter_config(argsdict, argsdict_cfg_str):
+    """Streaming output should join to the same string as to_config."""
+    chunks = export.iter_config('Section', argsdict)
+    assert "".join(chunks) == argsdict_cfg_str
+    with pytest.raises(ValueError):
+        export.iter_config('Section', dict(argsdict))
+
+def test_write_config(argsdict, argsdict_cfg_str):
+    out = io.StringIO()
+    export.write_config('Section', argsdict, out)
+    assert out.getvalue() == argsdict_cfg_str
+
+def test_to_multi_argparser(commands):
+    """Only the invoked subcommand should have its arguments built."""
+    parser = export.to_multi_argparser('tool', commands)
+    subparsers = parser._subparsers._group_actions[0].choices
+    assert list(subparsers) == ['run', 'clean']
+    args = parser.parse_args(shlex.split("clean --force --keep 5"))
+    assert args.command == 'clean'
+    assert args.force
+    assert args.keep == 5
+    # The other command's parser is still empty
+    assert len(subparsers['run']._actions) == 1
+    assert len(subparsers['clean']._actions) == 3
+    # The same parser works for any command, any number of times
+    assert parser.parse_args(["run", "/dev/null"]).command == 'run'
+    assert parser.parse_args(["clean"]).keep == 2
+    assert len(subparsers['clean']._actions) == 3
+
+def test_to_multi_argparser_no_command(commands):
+    parser = export.to_multi_argparser('tool', commands)
+    assert 'Remove outputs' in parser.format_help()
+    with pytest.raises(SystemExit):
+        parser.parse_args([])
+    with pytest.raises(SystemExit):
+        parser.parse_args(["bogus"])
+
+def test_to_multi_argparser_config(commands):
+    """Each subcommand should read defaults from its own config section."""
+    config = ConfigParser.ConfigParser()
+    config.read_string(u"[run]\narg2 = 7\n[clean]\nkeep = 9\n")
+    parser = export.to_multi_argparser('tool', commands, config=config)
+    assert parser.parse_args(["clean"]).keep == 9
+    assert parser.parse_args(["run", "/dev/null"]).arg2 == 7
+
+def test_bash_completion(argsdict, tmpdir):
+    script = export.to_completion('prog', argsdict, 'bash')
+    assert "complete -o default -F _argutils_prog prog" in script
+    assert "--arg1 --arg2 --hidden --flag --choices" in script
+    assert "compgen -W '1 2 3'" in script
+    # Positional arguments aren't offered as options
+    assert "--output" not in script
+    script_file = tmpdir.join("prog.bash")
+    script_file.write(script)
+    try:
+        assert subprocess.call(["bash", "-n", str(script_file)]) == 0
+    except OSError:
+        pass
+
+def test_zsh_completion(argsdict):
+    script = export.to_completion('prog', argsdict, 'zsh')
+    assert script.startswith("#compdef prog\n")
+    assert "'--choices[]:choices:(1 2 3)'" in script
+    assert "'--flag[This is a flag]'" in script
+    assert ":output:_files" in script
+
+def test_fish_completion(argsdict):
+    argsdict['infile'] = {'type': FILE_R, 'help': "it's a file"}
+    script = export.to_completion('prog', argsdict, 'fish')
+    assert "complete -c prog -l choices -x -a '1 2 3'" in script
+    assert "complete -c prog -l flag -d 'This is a flag'\n" in script
+    assert "complete -c prog -l infile -d 'it'\\''s a file' -r -F" in script
+
+def test_completion_bad_shell(argsdict):
+    with pytest.raises(ValueError):
+        export.to_completion('prog', argsdict, 'tcsh')
+
+def test_render_help(argsdict, monkeypatch):
+    """Pre-rendered help should match argparse's output and be reused."""
+    monkeypatch.setenv("COLUMNS", "100")
+    rendered = export.render_help('Command', argsdict)
+    live = export.to_argparser('Command', argsdict)
+    assert rendered['width'] == 98
+    assert rendered['text'] == live.format_help()
+
+    parser = export.to_argparser(
+        'Command', argsdict, rendered_help=dict(rendered, text="cached"))
+    assert parser.format_help() == "cached"
+    with pytest.raises(SystemExit):
+        parser.parse_args(["--help"])
+
+def test_render_help_invalidated(argsdict, monkeypatch):
+    """Stale or wrong-width help should fall back to live formatting."""
+    monkeypatch.setenv("COLUMNS", "100")
+    rendered = dict(export.render_help('Command', argsdict), text="cached")
+    argsdict['extra'] = {'help': 'a new argument'}
+    parser = export.to_argparser('Command', argsdict, rendered_help=rendered)
+    assert 'a new argument' in parser.format_help()
+    del argsdict['extra']
+
+    parser = export.to_argparser('Command', argsdict, rendered_help=rendered)
+    monkeypatch.setenv("COLUMNS", "60")
+    assert parser.format_help() != "cached"
+    assert parser.format_help() == export.to_argparser(
+        'Command', argsdict).format_help()
+
+def test_render_help_checked_lazily(argsdict, monkeypatch):
+    """The spec should only be hashed when the help is formatted."""
+    from argutils import cache
+    rendered = dict(export.render_help('Command', argsdict), text="cached")
+    digests = []
+    spec_digest = cache.spec_digest
+    monkeypatch.setattr(
+        cache, 'spec_digest',
+        lambda *parts: digests.append(parts) or spec_digest(*parts))
+    parser = export.to_argparser('Command', argsdict, rendered_help=rendered)
+    assert digests == []
+    assert parser.format_help() == "cached"
+    assert len(digests) == 1
@@ -0,0 +1,83 @@
+"""Test the fast-path parser against argparse."""
+import argparse
+import shlex
+from collections import OrderedDict
+import pytest
+import argutils
+from argutils import export
+from argutils.fastparse import FastParser
+try:
+    import ConfigParser
+except ImportError:
+    import configparser as ConfigParser
+
+@pytest.fixture
+def simple_argsdict():
+    return OrderedDict([
+        ('name', {'default': 'someone', 'help': 'a name'}),
+        ('count', {'type': 'int', 'default': 2}),
+        ('ratio', {'type': 'float'}),
+        ('counter', {'type': 'int'}),
+        ('verbose', {'argtype': 'flag'}),
+        ('input', {'argtype': 'arg'}),
+    ])
+
+@pytest.mark.parametrize("argv", [
+    "in.txt",
+    "--name bob in.txt --verbose",
+    "--name=bob --count=5 in.txt",
+    "--na bob --rat 0.5 in.txt",
+    "--counter 7 --count 1 --count 3 -",
+])
+def test_same_namespace(simple_argsdict, argv):
+    """The fast path should give the same Namespace as argparse."""
+    parser = export.to_fastparser('test', simple_argsdict)
+    assert isinstance(parser, FastParser)
+    expected = export.to_argparser('test', simple_argsdict)
+    args = parser.parse_args(shlex.split(argv))
+    assert args == expected.parse_args(shlex.split(argv))
+    # The fast path never needed the ArgumentParser
+    assert parser._parser is None
+
+@pytest.mark.parametrize("argv", [
+    "",
+    "--count notanumber in.txt",
+    "--coun 1 in.txt",
+    "--bogus in.txt",
+    "in.txt extra",
+    "--verbose=1 in.txt",
+    "--name",
+    "--help",
+])
+def test_errors_fall_back(simple_argsdict, argv):
+    """Errors (including ambiguous abbreviations) are reported by argparse."""
+    parser = export.to_fastparser('test', simple_argsdict)
+    with pytest.raises(SystemExit):
+        parser.parse_args(shlex.split(argv))
+    assert parser._parser is not None
+
+def test_fallback_values(simple_argsdict):
+    """Arguments the fast path doesn't handle still parse correctly."""
+    parser = export.to_fastparser('test', simple_argsdict)
+    args = parser.parse_args(shlex.split("--ratio -0.5 in.txt"))
+    assert args.ratio == -0.5
+
+def test_unsupported_spec(argsdict):
+    """Specs with FileTypes, choices, etc. should get an ArgumentParser."""
+    parser = export.to_fastparser('test', argsdict)
+    assert isinstance(parser, argparse.ArgumentParser)
+
+def test_set_parser_defaults(simple_argsdict):
+    config = ConfigParser.ConfigParser()
+    config.add_section('test')
+    config.set('test', 'count', '9')
+    config.set('test', 'verbose', '')
+    config.set('test', 'other', 'value')
+    parser = export.to_fastparser('test', simple_argsdict)
+    parser = argutils.set_parser_defaults(parser, config)
+    expected = export.to_argparser('test', simple_argsdict)
+    expected = argutils.set_parser_defaults(expected, config)
+    args = parser.parse_args(["in.txt"])
+    assert args == expected.parse_args(["in.txt"])
+    assert args.count == 9
+    assert args.other == 'value'
@@ -0,0 +1,44 @@
+"""Test that importing argutils stays cheap."""
+import subprocess
+import sys
+import pytest
+
+# Cumulative import time allowed for the argutils package, in microseconds.
+# This is generous (argparse alone is a few ms) but catches a heavy module
+# such as yaml being pulled in at import time again.
+IMPORT_BUDGET_US = 40000
+
+def _import_in_subprocess(code, *options):
+    proc = subprocess.Popen(
+        [sys.executable] + list(options) + ["-c", code],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    out, err = proc.communicate()
+    assert proc.returncode == 0, err
+    return out, err
+
+def test_lazy_imports():
+    """Format parsers should not be imported until they're used."""
+    out, _ = _import_in_subprocess(
+        "import sys, argutils, argutils.read, argutils.export; "
+        "print(' '.join(sorted(sys.modules)))")
+    modules = out.split()
+    for name in ('yaml', 'json', 'six', 'textwrap', 'configparser'):
+        assert name not in modules
+
+@pytest.mark.skipif(
+    sys.version_info < (3, 7), reason="-X importtime requires Python 3.7+")
+def test_import_time():
+    """`python -X importtime` should report argutils within budget."""
+    _, err = _import_in_subprocess(
+        "import argutils.read, argutils.export", "-X", "importtime")
+    cumulative = 0
+    for line in err.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, total, package = line[len("import time:"):].split("|")
+        # Only count top-level imports made from the -c statement, since
+        # their cumulative time already includes anything nested
+        if package.startswith(" argutils") and total.strip().isdigit():
+            cumulative += int(total)
+    assert 0 < cumulative < IMPORT_BUDGET_US
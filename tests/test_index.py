@@ -0,0 +1,89 @@
+"""Test indexed multi-command spec files."""
+import io
+import json
+import shlex
+import pytest
+from argutils import export, index, read
+from argutils.bench import to_yaml
+
+def _write(path, text):
+    with io.open(str(path), 'w', encoding='utf-8') as out:
+        out.write(text)
+    return str(path)
+
+@pytest.fixture(params=['yaml', 'json'])
+def spec_file(request, commands, tmpdir):
+    # Non-ASCII help makes character and byte offsets differ
+    commands['clean']['_meta']['help'] = u"Remove outputs \u2014 all of them"
+    if request.param == 'json':
+        text = json.dumps(commands, indent=2, ensure_ascii=False)
+    else:
+        text = u"# A suite of tools \u2014 indexed\n"
+        for name, value in commands.items():
+            if name == '_meta':
+                text += u"_meta: {0}\n".format(
+                    json.dumps(value, ensure_ascii=False))
+                continue
+            text += u"{0}:  # \u00e9\n".format(name) + u"".join(
+                u"  " + line + u"\n"
+                for line in to_yaml(value).splitlines())
+    return _write(tmpdir.join('suite.' + request.param), text)
+
+def test_load_command(spec_file, commands):
+    commands['clean']['_meta']['help'] = u"Remove outputs \u2014 all of them"
+    for name in commands:
+        assert read.load_command(spec_file, name) == commands[name]
+    idx = index.load_index(spec_file)
+    assert [entry[0] for entry in idx['commands']] == list(commands)
+    assert idx['commands'][2][3] == u"Remove outputs \u2014 all of them"
+
+def test_only_selected_command_is_read(spec_file, commands, monkeypatch):
+    index.load_index(spec_file)
+    chunks = []
+    load_chunk = index.load_chunk
+    monkeypatch.setattr(index, 'load_chunk', lambda *args: (
+        chunks.append(args[2]) or load_chunk(*args)))
+    spec = read.indexed(spec_file)
+    parser = export.to_multi_argparser('suite', spec)
+    args = parser.parse_args(shlex.split("clean --keep 4"))
+    assert args.command == 'clean' and args.keep == 4
+    assert sorted(chunks) == ['_meta', 'clean']
+
+def test_index_rebuilt_when_spec_changes(spec_file, tmpdir):
+    idx = index.load_index(spec_file)
+    assert json.loads(tmpdir.join(
+        spec_file.split('/')[-1] + '.idx').read()) == idx
+    if spec_file.endswith('.json'):
+        _write(spec_file, u'{"only": {"x": {"default": 1}}}')
+    else:
+        _write(spec_file, u"only:\n  x:\n    default: 1\n")
+    assert read.load_command(spec_file, 'only') == {'x': {'default': 1}}
+    assert [entry[0] for entry in index.load_index(spec_file)['commands']] \
+        == ['only']
+
+def test_index_in_cache_dir(spec_file, tmpdir, monkeypatch):
+    """Indexes that can't be written next to the spec go in the cache."""
+    monkeypatch.setenv('ARGUTILS_CACHE_DIR', str(tmpdir.join('cache')))
+    write_index = index._write_index
+    monkeypatch.setattr(index, '_write_index', lambda path, idx: (
+        path != spec_file + '.idx' and write_index(path, idx)))
+    builds = []
+    build_index = index.build_index
+    monkeypatch.setattr(index, 'build_index', lambda *args: (
+        builds.append(args) or build_index(*args)))
+    for _ in range(3):
+        assert read.load_command(spec_file, 'clean')['keep']['default'] == 2
+    assert len(builds) == 1
+    assert not tmpdir.join(spec_file.split('/')[-1] + '.idx').exists()
+    assert len(tmpdir.join('cache', 'index').listdir()) == 1
+
+def test_unindexable_yaml(tmpdir):
+    spec_file = _write(tmpdir.join('anchors.yaml'), (
+        u"base: &base\n  threads:\n    type: int\n"
+        u"run:\n  <<: *base\n  force:\n    argtype: flag\n"))
+    assert index.load_index(spec_file)['commands'] is None
+    run = read.load_command(spec_file, 'run')
+    assert list(run) == ['threads', 'force']
+    flow = _write(tmpdir.join('flow.yaml'), u"{a: {x: {default: 1}}}\n")
+    assert index.load_index(flow)['commands'] is None
+    assert read.load_command(flow, 'a') == {'x': {'default': 1}}
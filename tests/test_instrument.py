@@ -0,0 +1,59 @@
+"""Test the phase timing instrumentation."""
+import json
+import pytest
+import argutils
+from argutils import instrument, read, export
+
+@pytest.fixture
+def recording():
+    instrument.clear()
+    instrument.enable()
+    yield
+    instrument.disable()
+    instrument.clear()
+
+def test_disabled_by_default(argsdict):
+    instrument.clear()
+    assert not instrument.is_enabled()
+    export.to_argparser('test', argsdict)
+    assert instrument.records() == []
+
+def test_phases_recorded(recording, json_file, argsdict):
+    with open(json_file) as infile:
+        read.from_json(infile.read())
+    export.to_argparser('test', argsdict)
+    export.to_config('test', argsdict)
+    phases = [r.phase for r in instrument.records()]
+    assert phases[0] == 'read.from_json'
+    assert phases.count('export._add_argument') == len(argsdict) - 1
+    assert 'export.to_argparser' in phases
+    assert 'export.to_config' in phases
+    details = [r.detail for r in instrument.records()
+               if r.phase == 'export._add_argument']
+    assert details[0] == 'arg1'
+
+def test_callbacks(argsdict):
+    seen = []
+    instrument.clear()
+    instrument.add_callback(seen.append)
+    try:
+        export.to_config('test', argsdict)
+        # Callbacks alone don't keep records
+        assert instrument.records() == []
+    finally:
+        instrument.remove_callback(seen.append)
+    assert not instrument.is_enabled()
+    assert [r.phase for r in seen] == ['export.to_config']
+    assert seen[0].seconds >= 0
+
+def test_report(recording, argsdict):
+    export.to_argparser('test', argsdict)
+    table = instrument.report()
+    assert 'export._add_argument' in table
+    assert len(table.splitlines()) == 3
+    assert table.splitlines()[0].endswith("net blocks")
+    records = json.loads(instrument.report('json'))
+    assert len(records) == len(argsdict)
+    assert 'net_blocks' in records[0]
+    with pytest.raises(ValueError):
+        instrument.report('xml')
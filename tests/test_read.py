@@ -1,5 +1,6 @@
 import os
 import pytest
+import yaml
 from collections import OrderedDict
 import argutils
 import argutils.read
@@ -24,4 +25,100 @@ def test_blank_comment():
     assert argutils.format_comment(None) == ""
 
 
-    
\ No newline at end of file
+    
+def test_cached(yaml_file, argsdict, tmpdir):
+    """Cached reads should match the uncached result and reuse the entry."""
+    cache_dir = str(tmpdir.join("cache"))
+    spec = tmpdir.join("spec.yaml")
+    with open(yaml_file) as infile:
+        spec.write(infile.read())
+    result = argutils.read.cached(str(spec), cache_dir=cache_dir)
+    assert isinstance(result, OrderedDict)
+    assert result == argsdict
+    assert len(os.listdir(cache_dir)) == 1
+    # A second read comes from the cache entry
+    assert argutils.read.cached(str(spec), cache_dir=cache_dir) == argsdict
+
+def test_cached_invalidation(tmpdir):
+    """Changing the file should invalidate its cache entry."""
+    cache_dir = str(tmpdir.join("cache"))
+    spec = tmpdir.join("spec.json")
+    spec.write('{"arg1": {"default": 1}}')
+    result = argutils.read.cached(
+        str(spec), argutils.read.from_json, cache_dir=cache_dir)
+    assert result['arg1']['default'] == 1
+    spec.write('{"arg1": {"default": 22}}')
+    os.utime(str(spec), (0, 0))
+    result = argutils.read.cached(
+        str(spec), argutils.read.from_json, cache_dir=cache_dir)
+    assert result['arg1']['default'] == 22
+
+def test_cached_corrupt_entry(tmpdir):
+    """Corrupt cache entries should be ignored and rewritten."""
+    cache_dir = tmpdir.join("cache")
+    spec = tmpdir.join("spec.yaml")
+    spec.write("arg1:\n  default: 1\n")
+    argutils.read.cached(str(spec), cache_dir=str(cache_dir))
+    entry = cache_dir.listdir()[0]
+    entry.write("not a pickle")
+    result = argutils.read.cached(str(spec), cache_dir=str(cache_dir))
+    assert result['arg1']['default'] == 1
+    assert argutils.read.cached(str(spec), cache_dir=str(cache_dir)) == result
+
+@pytest.mark.skipif(
+    not hasattr(yaml, 'CSafeLoader'), reason="PyYAML built without libyaml")
+def test_yaml_loaders_match(yaml_file):
+    """The libyaml and pure-Python loaders should give identical results."""
+    with open(yaml_file) as infile:
+        yaml_str = infile.read()
+    c_loader = argutils.read._ordered_loader(yaml.CSafeLoader)
+    py_loader = argutils.read._ordered_loader(yaml.SafeLoader)
+    c_result = yaml.load(yaml_str, c_loader)
+    py_result = yaml.load(yaml_str, py_loader)
+    assert c_result == py_result
+    assert list(c_result.keys()) == list(py_result.keys())
+    for key in c_result:
+        assert list(c_result[key].items()) == list(py_result[key].items())
+        for c_value, py_value in zip(
+                c_result[key].values(), py_result[key].values()):
+            assert type(c_value) == type(py_value)
+
+def test_format_comment_fast_path():
+    """Short comments should match the textwrap-based formatting."""
+    assert argutils.format_comment("  short help ") == "# short help\n"
+    assert argutils.format_comment("   ") == "\n"
+    long_text = "word " * 30
+    wrapped = argutils.format_comment(long_text, width=20, quote="## ")
+    assert all(len(line) <= 23 for line in wrapped.splitlines())
+    assert wrapped.count("## ") == len(wrapped.splitlines())
+
+def test_format_comment_cache():
+    """Repeated comments should be served from the bounded cache."""
+    argutils._comment_cache.clear()
+    first = argutils.format_comment("Number of threads to use")
+    assert argutils.format_comment("Number of threads to use") is first
+    assert argutils.format_comment(
+        "Number of threads to use", quote="## ") == "## Number of threads to use\n"
+    assert len(argutils._comment_cache) == 2
+    for i in range(argutils.COMMENT_CACHE_SIZE + 1):
+        argutils.format_comment("help {0}".format(i))
+    assert len(argutils._comment_cache) <= argutils.COMMENT_CACHE_SIZE
+
+@pytest.mark.parametrize('compression', ['', '.gz', '.bz2'])
+def test_from_path(json_file, yaml_file, argsdict, tmpdir, compression):
+    """Specs should be read by path, whatever their format or compression."""
+    import bz2
+    import gzip
+    opener = {'': open, '.gz': gzip.open, '.bz2': bz2.BZ2File}[compression]
+    for source, name in [(json_file, 'spec.json'), (yaml_file, 'spec.yaml'),
+                         (json_file, 'spec'), (yaml_file, 'spec.txt')]:
+        path = str(tmpdir.join(name + compression))
+        with open(source, 'rb') as infile, opener(path, 'wb') as out:
+            out.write(infile.read())
+        result = argutils.read.from_path(path)
+        assert isinstance(result, OrderedDict)
+        assert result == argsdict
+        cache_dir = str(tmpdir.join('cache'))
+        for _ in range(2):
+            assert argutils.read.from_path(
+                path, use_cache=True, cache_dir=cache_dir) == argsdict
@@ -0,0 +1,68 @@
+"""Test picklable snapshots of parsed arguments."""
+import pickle
+import sys
+from collections import OrderedDict
+import pytest
+from argutils import batch, export
+from argutils.snapshot import FileRef, Snapshot
+
+@pytest.fixture
+def file_argsdict():
+    return OrderedDict([
+        ('count', OrderedDict([('type', 'int'), ('default', 2)])),
+        ('input', OrderedDict([('argtype', 'arg'), ('type', 'File-r')])),
+        ('output', OrderedDict([('type', 'File-w'), ('default', 'stdout')])),
+        ('log', OrderedDict([('type', 'LazyFile-w')])),
+        ('index', OrderedDict([('type', 'File-mmap')])),
+    ])
+
+def test_snapshot_round_trip(file_argsdict, tmpdir):
+    infile = tmpdir.join('in.txt')
+    infile.write("contents\n")
+    index = tmpdir.join('index.bin')
+    index.write_binary(b'index')
+    parser = export.to_argparser('test', file_argsdict)
+    args = parser.parse_args([
+        str(infile), '--log', str(tmpdir.join('log.txt')),
+        '--index', str(index)])
+    snap = Snapshot.take(args)
+    assert snap.values[snap.names.index('input')] == FileRef(str(infile), 'r')
+    assert snap.values[snap.names.index('output')] == FileRef('-', 'w')
+    assert snap.values[snap.names.index('index')] == FileRef(str(index), 'mmap')
+    copy = pickle.loads(pickle.dumps(snap, pickle.HIGHEST_PROTOCOL))
+    assert copy.names == snap.names
+    restored = copy.restore()
+    assert restored.count == 2
+    assert restored.input.read() == "contents\n"
+    assert restored.output is sys.stdout
+    assert not restored.log.opened
+    assert restored.index[:] == b'index'
+    for args in (args, restored):
+        args.input.close()
+        args.index.close()
+
+def test_reopen_for_writing(tmpdir):
+    out = tmpdir.join('out.txt')
+    out.write("kept\n")
+    with FileRef(str(out), 'w').open() as reopened:
+        reopened.write("added\n")
+    assert out.read() == "kept\nadded\n"
+
+def test_parse_many_processes_with_files(file_argsdict, tmpdir):
+    infile = tmpdir.join('in.txt')
+    infile.write("contents\n")
+    results = batch.parse_many(
+        'test', file_argsdict, [[str(infile)], ['--count', 'x']],
+        pool='process', workers=2)
+    assert [r.ok for r in results] == [True, False]
+    # Files aren't opened again unless the snapshots are restored
+    assert isinstance(results[0].namespace, Snapshot)
+    args = results[0].namespace.restore()
+    assert args.input.read() == "contents\n"
+    assert args.output is sys.stdout
+    args.input.close()
+    results = batch.parse_many(
+        'test', file_argsdict, [[str(infile)]], pool='process', workers=1,
+        restore=True)
+    assert results[0].namespace.input.read() == "contents\n"
+    results[0].namespace.input.close()
@@ -0,0 +1,160 @@
+"""Test the ArgSpec/CommandSpec representation."""
+import pickle
+import shlex
+import sys
+import pytest
+from argutils import export, read
+from argutils.spec import ArgSpec, Choices, CommandSpec
+
+def test_round_trip(argsdict, json_file):
+    spec = CommandSpec.from_dict(argsdict)
+    assert spec.to_dict() == argsdict
+    assert list(spec.to_dict().keys()) == list(argsdict.keys())
+    with open(json_file) as infile:
+        assert CommandSpec.from_dict(read.from_json(infile.read())) == spec
+    assert CommandSpec.from_dict(spec) is spec
+    assert pickle.loads(pickle.dumps(spec)) == spec
+
+def test_resolved_once(argsdict):
+    spec = CommandSpec.from_dict(argsdict)
+    assert spec.description == "Section description"
+    assert spec['arg2'].type is int
+    assert spec['choices'].choices == (1, 2, 3)
+    assert spec['output'].default == 'stdout'
+    assert spec['output'].flag == 'output'
+    assert spec['flag'].argtype == 'flag'
+    assert spec['hidden'].exclude
+    assert ArgSpec('n', {'nargs': '+'}).nargs == '+'
+    assert ArgSpec('n', {'nargs': '2'}).nargs == 2
+
+def test_streams_resolved_per_parser(argsdict, monkeypatch):
+    """stdin/stdout defaults should be the streams when the parser is built,
+    not when the spec was read."""
+    import io
+    spec = CommandSpec.from_dict(argsdict)
+    redirected = io.StringIO()
+    monkeypatch.setattr(sys, 'stdout', redirected)
+    parser = export.to_argparser('test', spec)
+    assert parser.get_default('output') is redirected
+    assert spec['arg1'].get('default') == 'default_value'
+    assert 'help' in spec['arg1'] and 'nargs' not in spec['arg1']
+    assert spec['arg1']['default'] == 'default_value'
+    with pytest.raises(KeyError):
+        spec['arg1']['nargs']
+
+def test_immutable(argsdict):
+    spec = CommandSpec.from_dict(argsdict)
+    with pytest.raises(AttributeError):
+        spec['arg1'].default = 'other'
+    with pytest.raises(AttributeError):
+        spec.args = ()
+    with pytest.raises(AttributeError):
+        spec['arg1'].extra = 1
+
+def test_bad_spec():
+    with pytest.raises(ValueError):
+        CommandSpec.from_dict({'arg1': {'type': 'notatype'}})
+
+def test_exporters_accept_spec(argsdict, argsdict_cfg_str):
+    spec = CommandSpec.from_dict(argsdict)
+    assert export.to_config('Section', spec) == argsdict_cfg_str
+    argv = shlex.split("--arg2 5 --flag --choices 2 /dev/null")
+    args = export.to_argparser('Command', spec).parse_args(argv)
+    expected = export.to_argparser('Command', argsdict).parse_args(argv)
+    assert args.output.name == expected.output.name
+    del args.output, expected.output
+    assert args == expected
+    assert export.to_python_module('Command', spec) == \
+        export.to_python_module('Command', argsdict)
+
+def test_choices_container():
+    choices = Choices([1, 2, 3])
+    assert 2 in choices and 4 not in choices
+    assert ['unhashable'] not in choices
+    assert list(choices) == [1, 2, 3]
+    assert choices == (1, 2, 3)
+    assert choices.summary() is None
+    many = Choices(range(100))
+    assert many.summary() == "{0,1,2,... (100 choices)}"
+
+def test_choices_file(tmpdir):
+    """File-backed choices should only be read when the option is used."""
+    choices_file = tmpdir.join("samples.txt")
+    choices_file.write("# sample IDs\n10\n20\n\n30\n")
+    argsdict = {
+        'sample': {'choices_file': str(choices_file), 'type': 'int'},
+        'other': {},
+    }
+    spec = CommandSpec.from_dict(argsdict)
+    parser = export.to_argparser('test', spec)
+    assert "{values in samples.txt}" in parser.format_help()
+    parser.parse_args(["--other", "x"])
+    assert not spec['sample'].choices.loaded
+    assert parser.parse_args(["--sample", "20"]).sample == 20
+    assert spec['sample'].choices.loaded
+    with pytest.raises(SystemExit):
+        parser.parse_args(["--sample", "40"])
+    # Defaults aren't checked, and don't cause the file to be read
+    spec = CommandSpec.from_dict(argsdict)
+    parser = export.to_argparser('test', spec)
+    parser.set_defaults(sample='0')
+    assert parser.parse_args([]).sample == 0
+    assert not spec['sample'].choices.loaded
+    restored = pickle.loads(pickle.dumps(spec['sample'].choices))
+    assert restored == spec['sample'].choices
+    assert not restored.loaded
+
+def test_choices_generated_module(tmpdir):
+    choices_file = tmpdir.join("samples.txt")
+    choices_file.write("a\nb\n")
+    argsdict = {
+        'many': {'choices': ", ".join(str(i) for i in range(50)),
+                 'type': 'int'},
+        'sample': {'choices_file': str(choices_file)},
+    }
+    source = export.to_python_module('test', argsdict)
+    assert "from argutils.spec import Choices\n" in source
+    assert "from argutils.spec import ChoicesAction\n" in source
+    namespace = {}
+    exec(compile(source, "<generated>", "exec"), namespace)
+    parser = namespace['build_parser']()
+    assert parser.format_help() == export.to_argparser(
+        'test', argsdict).format_help()
+    args = parser.parse_args(["--many", "42", "--sample", "b"])
+    assert args.many == 42 and args.sample == 'b'
+
+def test_choices_errors(tmpdir, capsys):
+    """Errors should summarize long lists of choices."""
+    choices_file = tmpdir.join("samples.txt")
+    choices_file.write("".join("s{0}\n".format(i) for i in range(50000)))
+    argsdict = {
+        'sample': {'choices_file': str(choices_file)},
+        'many': {'choices': ", ".join(str(i) for i in range(50)),
+                 'type': 'int'},
+        'missing': {'choices_file': str(tmpdir.join("missing.txt"))},
+    }
+    parser = export.to_argparser('test', argsdict)
+    for argv, message in [
+            (["--sample", "x"], "argument --sample: invalid choice: 'x' "
+             "(choose from 's0', 's1', 's2', ... (50000 choices in "
+             "samples.txt))"),
+            (["--many", "50"], "invalid choice: 50 (choose from 0, 1, 2, ... "
+             "(50 choices))"),
+            (["--many", "x"], "argument --many: invalid int value: 'x'"),
+            (["--missing", "x"], "argument --missing: can't read the "
+             "choices in")]:
+        with pytest.raises(SystemExit):
+            parser.parse_args(argv)
+        err = capsys.readouterr().err
+        assert message in err
+        assert len(err) < 1000
+
+def test_choices_file_relative_path(tmpdir):
+    tmpdir.join("samples.txt").write("a\nb\n")
+    spec_file = tmpdir.join("spec.yaml")
+    spec_file.write("sample:\n  choices_file: samples.txt\n")
+    argsdict = read.from_path(str(spec_file))
+    assert argsdict['sample']['choices_file'] == str(
+        tmpdir.join("samples.txt"))
+    parser = export.to_argparser('test', argsdict)
+    assert parser.parse_args(["--sample", "b"]).sample == 'b'
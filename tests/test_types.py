@@ -0,0 +1,205 @@
+"""Test the argument types in argutils.types."""
+import argparse
+import array
+import pickle
+import sys
+from collections import OrderedDict
+import pytest
+import argutils
+from argutils import export
+from argutils.spec import ArgSpec
+from argutils.types import ArrayAction, ArrayType, LazyFileType
+
+@pytest.fixture
+def array_argsdict():
+    return OrderedDict([
+        ('coords', OrderedDict([('type', 'int-array')])),
+        ('thresholds', OrderedDict([
+            ('type', 'float-array'), ('default', '0.5, 1.5')])),
+    ])
+
+def test_array_type_without_numpy():
+    ints = ArrayType('int', use_numpy=False)(['1', '-2', '3'])
+    assert isinstance(ints, array.array)
+    assert list(ints) == [1, -2, 3]
+    floats = ArrayType('float', use_numpy=False)('0.5, 1e3 2')
+    assert floats.typecode == 'd'
+    assert list(floats) == [0.5, 1000.0, 2.0]
+
+def test_array_type_with_numpy():
+    numpy = pytest.importorskip('numpy')
+    ints = ArrayType('int', use_numpy=True)(['1', '2', '3'])
+    assert isinstance(ints, numpy.ndarray)
+    assert ints.dtype == numpy.int64
+    assert ints.tolist() == [1, 2, 3]
+    floats = ArrayType('float', use_numpy=True)(['0.5', '2'])
+    assert floats.dtype == numpy.float64
+
+@pytest.mark.parametrize('use_numpy', [False, None])
+def test_array_type_errors(use_numpy):
+    with pytest.raises(argparse.ArgumentTypeError) as err:
+        ArrayType('int', use_numpy)(['1', '2', 'x3', '4'])
+    assert "invalid int value: 'x3'" in str(err.value)
+    with pytest.raises(ValueError):
+        ArrayType('complex')
+
+def test_array_spec():
+    spec = ArgSpec('coords', {'type': 'int-array'})
+    assert spec.type == ArrayType('int')
+    assert spec.action is ArrayAction
+    assert spec.nargs == '+'
+    assert ArgSpec('xy', {'type': 'int-array', 'nargs': 2}).nargs == 2
+    assert pickle.loads(pickle.dumps(spec.type)) == spec.type
+    with pytest.raises(ValueError):
+        ArgSpec('coords', {'type': 'int-array', 'choices': '1,2'})
+
+def test_array_parser(array_argsdict, capsys):
+    parser = export.to_argparser('test', array_argsdict)
+    args = parser.parse_args(['--coords'] + [str(i) for i in range(1000)])
+    assert list(args.coords) == list(range(1000))
+    assert list(args.thresholds) == [0.5, 1.5]
+    with pytest.raises(SystemExit):
+        parser.parse_args(['--coords', '1', 'two'])
+    assert "argument --coords: invalid int value: 'two'" in (
+        capsys.readouterr().err)
+
+def test_array_config_defaults(array_argsdict):
+    try:
+        from ConfigParser import SafeConfigParser as ConfigParser
+    except ImportError:
+        from configparser import ConfigParser
+    config = ConfigParser()
+    config.add_section('test')
+    config.set('test', 'coords', '1, 2 3')
+    parser = argutils.set_parser_defaults(
+        export.to_argparser('test', array_argsdict), config)
+    args = parser.parse_args([])
+    assert not isinstance(args.coords, str)
+    assert list(args.coords) == [1, 2, 3]
+    assert list(parser.parse_args(['--coords', '4']).coords) == [4]
+
+def test_array_python_module(array_argsdict):
+    source = export.to_python_module('test', array_argsdict)
+    assert 'from argutils.types import ArrayAction\n' in source
+    assert 'from argutils.types import ArrayType\n' in source
+    # Defaults are kept as strings, so the module doesn't need NumPy
+    assert 'numpy' not in source
+    assert "default='0.5, 1.5'" in source
+    assert repr(ArrayType('int', use_numpy=False)) == (
+        "ArrayType('int', use_numpy=False)")
+    namespace = {}
+    exec(compile(source, 'test_parser', 'exec'), namespace)
+    args = namespace['build_parser']().parse_args(['--coords', '4', '5'])
+    assert list(args.coords) == [4, 5]
+    assert list(args.thresholds) == [0.5, 1.5]
+
+@pytest.fixture
+def argfile_argsdict():
+    return OrderedDict([
+        ('inputs', OrderedDict([('argtype', 'arg'), ('argfile', True)])),
+        ('sizes', OrderedDict([('type', 'int'), ('argfile', '+')])),
+    ])
+
+def test_argfile_values(argfile_argsdict, tmpdir):
+    paths = tmpdir.join('paths.txt')
+    paths.write("# inputs\na.txt\n\nb.txt\n")
+    parser = export.to_argparser('test', argfile_argsdict)
+    args = parser.parse_args(
+        ['first.txt', '@' + str(paths), 'last.txt', '--sizes', '1', '2'])
+    assert not isinstance(args.inputs, list)
+    assert list(args.inputs) == ['first.txt', 'a.txt', 'b.txt', 'last.txt']
+    # The files are read again on each iteration
+    paths.write("c.txt\n")
+    assert list(args.inputs) == ['first.txt', 'c.txt', 'last.txt']
+    assert list(args.sizes) == [1, 2]
+    assert pickle.loads(pickle.dumps(args.inputs)) == args.inputs
+
+def test_argfile_gzip_and_types(argfile_argsdict, tmpdir):
+    import gzip
+    sizes = str(tmpdir.join('sizes.txt.gz'))
+    with gzip.open(sizes, 'wt') as out:
+        out.write("".join("{0}\n".format(i) for i in range(10000)))
+    parser = export.to_argparser('test', argfile_argsdict)
+    args = parser.parse_args(['x', '--sizes', '+' + sizes, '5'])
+    assert sum(args.sizes) == sum(range(10000)) + 5
+    with gzip.open(sizes, 'wt') as out:
+        out.write("1\ntwo\n")
+    with pytest.raises(ValueError) as err:
+        list(args.sizes)
+    assert "line 2 of {0}: 'two'".format(sizes) in str(err.value)
+
+def test_argfile_checks_and_defaults(argfile_argsdict, capsys):
+    parser = export.to_argparser('test', argfile_argsdict)
+    with pytest.raises(SystemExit):
+        parser.parse_args(['x', '--sizes', '1', 'x'])
+    assert "argument --sizes: invalid int value: 'x'" in (
+        capsys.readouterr().err)
+    parser.set_defaults(sizes='3 4')
+    args = parser.parse_args(['x'])
+    assert list(args.sizes) == [3, 4]
+
+def test_argfile_spec(argfile_argsdict):
+    spec = ArgSpec('inputs', argfile_argsdict['inputs'])
+    assert spec.argfile == '@'
+    assert spec.nargs == '+'
+    assert ArgSpec('inputs', {}).argfile is None
+    with pytest.raises(ValueError):
+        ArgSpec('inputs', {'argfile': True, 'choices': 'a,b'})
+    source = export.to_python_module('test', argfile_argsdict)
+    assert 'from argutils.types import ArgfileAction\n' in source
+    assert "argfile_prefix='+'" in source
+
+@pytest.fixture
+def file_argsdict():
+    return OrderedDict([
+        ('log', OrderedDict([('type', 'LazyFile-w')])),
+        ('data', OrderedDict([('type', 'File-rb'), ('bufsize', 65536),
+                              ('default', 'stdin')])),
+        ('index', OrderedDict([('type', 'File-mmap')])),
+    ])
+
+def test_lazy_file(file_argsdict, tmpdir):
+    log = tmpdir.join('log.txt')
+    parser = export.to_argparser('test', file_argsdict)
+    args = parser.parse_args(['--log', str(log)])
+    assert not args.log.opened
+    assert not log.exists()
+    with args.log as out:
+        out.write("written\n")
+    assert args.log.closed
+    assert log.read() == "written\n"
+    assert ArgSpec('x', {'type': 'LazyFile-rb'}).type == LazyFileType('rb')
+    copy = pickle.loads(pickle.dumps(args.log))
+    assert copy.name == str(log) and not copy.opened
+
+def test_binary_file(file_argsdict, tmpdir):
+    data = tmpdir.join('data.bin')
+    data.write_binary(b'\x00\x01')
+    parser = export.to_argparser('test', file_argsdict)
+    args = parser.parse_args(['--data', str(data)])
+    assert args.data.read() == b'\x00\x01'
+    args.data.close()
+    spec = ArgSpec('data', file_argsdict['data'])
+    assert repr(spec.type) == "FileType('rb', 65536)"
+    assert parser.get_default('data') is sys.stdin.buffer
+
+def test_mmap_file(file_argsdict, tmpdir):
+    index = tmpdir.join('index.bin')
+    index.write_binary(b'header' + b'\x00' * 4096 + b'needle')
+    parser = export.to_argparser('test', file_argsdict)
+    args = parser.parse_args(['--index', str(index)])
+    assert args.index.name == str(index)
+    assert args.index[:6] == b'header'
+    assert args.index.find(b'needle') == 4102
+    args.index.close()
+    empty = tmpdir.join('empty.bin')
+    empty.write_binary(b'')
+    assert parser.parse_args(['--index', str(empty)]).index == b''
+
+def test_file_types_python_module(file_argsdict):
+    source = export.to_python_module('test', file_argsdict)
+    assert "type=LazyFileType('w')" in source
+    assert "type=argparse.FileType('rb', 65536)" in source
+    # (pytest's stand-in for stdin is its own buffer)
+    assert "default=sys.stdin" in source
+    assert "type=MmapType()" in source